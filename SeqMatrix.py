@@ -1,15 +1,40 @@
+import logging
+import multiprocessing
 import sys
+import time
+
+# Reference point for the time to first paint logged with SEQMATRIX_TIMING=1
+STARTED = time.perf_counter()
+
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QListWidget, QTableWidget,
-                             QTableWidgetItem, QFileDialog, QLabel, QListWidgetItem,
-                             QInputDialog, QMessageBox, QSplitter, QLineEdit, QDialog, QTextEdit)
-from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QEvent, QThread, pyqtSignal
-from Bio import SeqIO, Entrez
+                             QHBoxLayout, QPushButton, QListView, QTableView,
+                             QAbstractItemView, QFileDialog, QLabel, QCheckBox,
+                             QInputDialog, QMessageBox, QSplitter, QProgressBar, QLineEdit, QDialog, QTextEdit,
+                             QTableWidget, QTableWidgetItem, QProgressDialog)
+from PyQt5.QtGui import QIcon, QColor, QKeySequence
+from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QAbstractTableModel, QAbstractListModel,
+                          QModelIndex, QMimeData, QTimer)
 import os
+import re
+import sqlite3
+
+from seqmatrix.autoassign import auto_assign, with_qualifiers
+from seqmatrix.cache import AccessionCache
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.features import FeatureIndex, cell_accessions, extract_genes
+from seqmatrix.labelsearch import LabelSearch
+from seqmatrix.matrix import Matrix, parse_block
+from seqmatrix.ncbi import NCBIFetcher
+from seqmatrix.project import PROJECT_SUFFIX, ProjectFile
+from seqmatrix import timing
+
+# Seconds between background saves of an open project
+AUTOSAVE_INTERVAL = 30
 
 # Set your email here
-Entrez.email = "your_email@example.com"
+NCBI_EMAIL = "your_email@example.com"
+# With an API key NCBI allows 10 requests per second instead of 3
+NCBI_API_KEY = os.environ.get("NCBI_API_KEY")
 
 # class LogDialog(QDialog):
 #     def __init__(self, parent=None):
@@ -27,45 +52,414 @@ Entrez.email = "your_email@example.com"
 
 class DownloadThread(QThread):
     log_signal = pyqtSignal(str)
+    record_signal = pyqtSignal(str, str, str)
+    progress_signal = pyqtSignal(int, int)
+    # Range or query cell text, full ids of the records it stands for
+    expanded_signal = pyqtSignal(str, list)
     
-    def __init__(self, sequences, table, parent=None):
+    def __init__(self, accessions, fetcher, parent=None):
         super().__init__(parent)
-        self.sequences = sequences
-        self.table = table
+        self.accessions = accessions
+        self.fetcher = fetcher
+
+    def cancel(self):
+        # Batches in flight finish; queued ones are dropped
+        self.fetcher.cancel()
 
     def run(self):
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    accession = item.text().strip()
-                    if accession:
-                        try:
-                            with Entrez.efetch(db="nucleotide", id=accession, rettype="gb", retmode="text") as handle:
-                                record = SeqIO.read(handle, "genbank")
-                                full_id = record.id + " " + record.description[len(record.id):].strip()
-                                self.sequences[full_id] = str(record.seq)
-                                self.log_signal.emit(f"[LOG] Downloaded sequence: {full_id}")
-                        except Exception as e:
-                            self.log_signal.emit(f"[ERROR] Failed to download {accession}: {e}")
-
-class SequenceItem(QListWidgetItem):
-    def __init__(self, name, sequence):
-        super().__init__(name)
-        self.sequence = sequence
-        # Enable drag
-        self.setFlags(self.flags() | Qt.ItemIsDragEnabled)
+        # One log line per run; a line per record slowed large downloads down
+        def on_record(accession, record):
+            self.record_signal.emit(accession, record.full_id, record.sequence)
+
+        # Ranges and queries are expanded only once all of their records arrived
+        def on_expanded(text, records):
+            self.expanded_signal.emit(text, [record.full_id for record in records])
+
+        try:
+            records, failures = self.fetcher.fetch_cells(self.accessions, callback=on_record,
+                                                         progress=self.progress_signal.emit, expanded=on_expanded)
+        except Exception as e:
+            self.log_signal.emit(f"[ERROR] Download failed: {e}")
+            return
+        self.log_signal.emit(f"[LOG] Downloaded {len(records)} sequences")
+        if self.fetcher.cancelled:
+            self.log_signal.emit(f"[LOG] Download cancelled, {len(failures)} accessions left; "
+                                 "press Download from NCBI to resume")
+        else:
+            for accession, error in failures.items():
+                self.log_signal.emit(f"[ERROR] Failed to download {accession}: {error}")
+        cache = self.fetcher.cache
+        if cache is not None:
+            self.log_signal.emit(f"[LOG] Cache hits: {cache.hits}, misses: {cache.misses}")
+
+class FeatureThread(QThread):
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)
+
+    def __init__(self, accessions, fetcher, parent=None):
+        super().__init__(parent)
+        self.accessions = accessions
+        self.fetcher = fetcher
+        self.records = {}
+
+    def cancel(self):
+        self.fetcher.cancel()
+
+    def run(self):
+        try:
+            self.records, failures = self.fetcher.fetch_features(self.accessions,
+                                                                 progress=self.progress_signal.emit)
+        except Exception as e:
+            self.log_signal.emit(f"[ERROR] Fetching GenBank records failed: {e}")
+            return
+        for accession, error in failures.items():
+            self.log_signal.emit(f"[ERROR] Failed to get the features of {accession}: {error}")
+
+class ImportThread(QThread):
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int)
+    indexed_signal = pyqtSignal(object)
+
+    def __init__(self, files, sources, parent=None):
+        super().__init__(parent)
+        self.files = files
+        # SequenceStore.sources() when the import started
+        self.sources = sources
+
+    def run(self):
+        total = sum(os.path.getsize(file) for file in self.files) or 1
+        done = 0
+        for file in self.files:
+            def on_progress(position, size):
+                self.progress_signal.emit(int(100 * (done + position) / total))
+
+            try:
+                index = FastaIndex.build(file, on_progress)
+            except Exception as e:
+                self.log_signal.emit(f"[ERROR] Failed to import {file}: {e}")
+                continue
+            finally:
+                done += os.path.getsize(file)
+            # Overlapping records are compared by digest when added to the pool;
+            # reading them here keeps that off the UI thread
+            for label in index.records.keys() & self.sources.keys():
+                index.digest(label)
+                previous = self.sources[label]
+                if previous is not None:
+                    previous.digest(label)
+            self.log_signal.emit(f"[LOG] Imported {len(index)} sequences from {file}")
+            self.indexed_signal.emit(index)
+
+class StatisticsDialog(QDialog):
+    COLUMNS = ["Partition", "Sequences", "Min bp", "Median bp", "Max bp", "GC", "Ambiguous", "Gaps", "Outliers"]
+
+    def __init__(self, stats, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.setWindowTitle("Statistics")
+        self.resize(700, 450)
+        layout = QVBoxLayout(self)
+        partitions = stats.partitions()
+        table = QTableWidget(len(partitions), len(self.COLUMNS), self)
+        table.setHorizontalHeaderLabels(self.COLUMNS)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        for row, partition in enumerate(partitions):
+            values = [partition.name, partition.sequences, partition.min_length, f"{partition.median_length:g}",
+                      partition.max_length, self.percent(partition.gc), self.percent(partition.ambiguous),
+                      self.percent(partition.gaps), partition.outliers]
+            for col, value in enumerate(values):
+                table.setItem(row, col, QTableWidgetItem(str(value)))
+        layout.addWidget(table)
+        outliers = stats.outliers()
+        layout.addWidget(QLabel(f"Length outliers (likely mis-assigned): {len(outliers)}"))
+        outlier_text = QTextEdit(self)
+        outlier_text.setReadOnly(True)
+        outlier_text.setPlainText("\n".join(f"{o.row} / {o.column}: {o.length}bp, partition median "
+                                             f"{o.median_length:g}bp ({o.label})" for o in outliers))
+        layout.addWidget(outlier_text)
+        buttons = QHBoxLayout()
+        export_btn = QPushButton("Export TSV")
+        export_btn.clicked.connect(self.exportTsv)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        buttons.addStretch()
+        buttons.addWidget(export_btn)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+    @staticmethod
+    def percent(value):
+        return "" if value != value else f"{value:.1%}"
+
+    def exportTsv(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Statistics", "statistics.tsv", "TSV files (*.tsv)")
+        if not path:
+            return
+        # Per-cell figures go next to the partition summary
+        cells_path = os.path.splitext(path)[0] + "_cells.tsv"
+        try:
+            self.stats.write_tsv(path)
+            self.stats.write_cells_tsv(cells_path)
+        except OSError as e:
+            print(f"[ERROR] Error exporting statistics: {e}")
+            return
+        print(f"[LOG] Exported statistics: {path}, {cells_path}")
+
+class ProjectSaveThread(QThread):
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, project, snapshot, parent=None):
+        super().__init__(parent)
+        self.project = project
+        self.snapshot = snapshot
+        self.saved = False
+
+    def run(self):
+        try:
+            written = self.project.write(self.snapshot)
+        except Exception as e:
+            self.log_signal.emit(f"[ERROR] Saving {self.project.path} failed: {e}")
+            return
+        self.saved = True
+        if written:
+            self.log_signal.emit(f"[LOG] Saved {written} sequences to {self.project.path}")
+
+class StatsThread(QThread):
+    log_signal = pyqtSignal(str)
+
+    def __init__(self, stats, todo, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.todo = todo
+        self.counts = None
+        # label id -> error, for sequences that could not be read
+        self.failures = {}
+
+    def run(self):
+        # Sequences of an opened project or indexed FASTA are read and decompressed here
+        try:
+            self.counts = self.stats.count(self.todo, self.failures)
+        except Exception as e:
+            self.log_signal.emit(f"[ERROR] Counting sequences failed: {e}")
+        for error in self.failures.values():
+            self.log_signal.emit(f"[ERROR] Cannot read the sequence of {error}")
+
+class PrepareThread(QThread):
+    log_signal = pyqtSignal(str)
+    progress_signal = pyqtSignal(int, int)
+
+    def __init__(self, matrix, parent=None):
+        super().__init__(parent)
+        self.matrix = matrix
+        self.prepared = None
+
+    def run(self):
+        from seqmatrix.prepare import prepare
+
+        try:
+            # Workers are spawned: forking this multi-threaded process is not safe
+            prepared, reports = prepare(self.matrix, progress=self.progress_signal.emit,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        except Exception as e:
+            self.log_signal.emit(f"[ERROR] Orienting and trimming failed: {e}")
+            return
+        for report in reports:
+            if report.sequences:
+                self.log_signal.emit(f"[LOG] {report.name}: {report.reversed} reverse-complemented, "
+                                     f"{report.trimmed} trimmed, {report.unmatched} not matching the reference")
+        self.prepared = prepared
+
+class SequenceListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.search = LabelSearch()
+        # Indices into self.search.labels matching the filter, None when unfiltered
+        self.visible = None
+        self.filter_text = ""
+        self.filter_regex = False
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.search) if self.visible is None else len(self.visible)
+
+    def label(self, row):
+        return self.search.labels[row if self.visible is None else self.visible[row]]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.label(index.row())
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid():
+            flags |= Qt.ItemIsDragEnabled
+        return flags
+
+    def mimeTypes(self):
+        return ["text/plain"]
+
+    def mimeData(self, indexes):
+        data = QMimeData()
+        # Dragged sequences are dropped onto the table as their labels
+        data.setText("\n".join(self.label(index.row()) for index in sorted(indexes, key=QModelIndex.row)))
+        return data
+
+    def appendLabels(self, labels):
+        # One insert per batch keeps large imports from relayouting per record
+        labels = list(labels)
+        if not labels:
+            return
+        first = len(self.search)
+        if self.visible is None:
+            self.beginInsertRows(QModelIndex(), first, first + len(labels) - 1)
+            self.search.extend(labels)
+            self.endInsertRows()
+            return
+        self.search.extend(labels)
+        hits = self.search.search(self.filter_text, self.filter_regex)
+        added = [i for i in hits if i >= first]
+        if added:
+            self.beginInsertRows(QModelIndex(), len(self.visible), len(self.visible) + len(added) - 1)
+            self.visible.extend(added)
+            self.endInsertRows()
+
+    def setLabels(self, labels):
+        # Replaces the whole list, keeping the current filter
+        self.beginResetModel()
+        self.search = LabelSearch()
+        self.search.extend(labels)
+        self.visible = self.search.search(self.filter_text, self.filter_regex)
+        self.endResetModel()
+
+    def setFilter(self, text, regex=False):
+        """Show only labels containing ``text`` (or matching it as a regex); raises re.error."""
+        visible = self.search.search(text, regex)
+        self.beginResetModel()
+        self.filter_text, self.filter_regex, self.visible = text, regex, visible
+        self.endResetModel()
+
+class MatrixTableModel(QAbstractTableModel):
+    cells_dropped = pyqtSignal(int, int, list)
+    # Background of cells that are neither a loaded sequence nor an accession number
+    MALFORMED_COLOR = QColor(255, 205, 205)
+
+    def __init__(self, matrix, parent=None):
+        super().__init__(parent)
+        self.matrix = matrix
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.matrix.row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.matrix.column_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            return self.matrix.cell(index.row(), index.column())
+        if role == Qt.BackgroundRole and self.matrix.is_malformed(self.matrix.cell(index.row(), index.column())):
+            return self.MALFORMED_COLOR
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        self.matrix.set_cell(index.row(), index.column(), value)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        names = self.matrix.column_names if orientation == Qt.Horizontal else self.matrix.row_names
+        return names[section] if 0 <= section < len(names) else None
+
+    def setHeaderData(self, section, orientation, value, role=Qt.EditRole):
+        names = self.matrix.column_names if orientation == Qt.Horizontal else self.matrix.row_names
+        if role != Qt.EditRole or not 0 <= section < len(names):
+            return False
+        names[section] = value
+        self.headerDataChanged.emit(orientation, section, section)
+        return True
 
-class CustomTableWidget(QTableWidget):
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid():
+            flags |= Qt.ItemIsEditable | Qt.ItemIsDropEnabled
+        return flags
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        # New rows are always appended to the matrix
+        first = self.matrix.row_count
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        self.matrix.resize(rows=first + count)
+        self.endInsertRows()
+        return True
+
+    def insertColumns(self, column, count, parent=QModelIndex()):
+        first = self.matrix.column_count
+        self.beginInsertColumns(QModelIndex(), first, first + count - 1)
+        self.matrix.resize(columns=first + count)
+        self.endInsertColumns()
+        return True
+
+    def grow(self, rows, columns):
+        # One insert notification per direction, however much the table grows
+        if columns > self.matrix.column_count:
+            self.insertColumns(self.matrix.column_count, columns - self.matrix.column_count)
+        if rows > self.matrix.row_count:
+            self.insertRows(self.matrix.row_count, rows - self.matrix.row_count)
+
+    def writeBlock(self, row, col, block):
+        """Write rows of cell texts from (row, col) on with one dataChanged for the whole block."""
+        if not block:
+            return
+        width = max(map(len, block))
+        self.grow(row + len(block), col + width)
+        self.matrix.write_block(row, col, block)
+        self.dataChanged.emit(self.index(row, col), self.index(row + len(block) - 1, col + width - 1))
+
+    def labelsChanged(self):
+        # Cell texts were changed directly on the matrix
+        if self.matrix.row_count and self.matrix.column_count:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self.matrix.row_count - 1, self.matrix.column_count - 1))
+
+    def supportedDropActions(self):
+        return Qt.CopyAction | Qt.MoveAction
+
+    def mimeTypes(self):
+        return ["text/plain"]
+
+    def dropMimeData(self, data, action, row, column, parent):
+        if not data.hasText() or not parent.isValid():
+            return False
+        labels = [label for label in data.text().split("\n") if label.strip()]
+        if not labels:
+            return False
+        # Several dragged sequences fill the column downwards from the drop target
+        row, col = parent.row(), parent.column()
+        self.writeBlock(row, col, [[label] for label in labels])
+        self.cells_dropped.emit(row, col, labels)
+        return True
+
+class CustomTableView(QTableView):
     def __init__(self, main_window, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.main_window = main_window
 
+    def setCurrentCell(self, row, col):
+        self.setCurrentIndex(self.model().index(row, col))
+
     def keyPressEvent(self, event):
+        model = self.model()
         if event.key() == Qt.Key_Return or event.key() == Qt.Key_Enter:
-            current_row = self.currentRow()
-            current_col = self.currentColumn()
-            if current_row < self.rowCount() - 1:
+            current_row = self.currentIndex().row()
+            current_col = self.currentIndex().column()
+            if current_row < model.rowCount() - 1:
                 self.setCurrentCell(current_row + 1, current_col)
             else:
                 # If it's the last row, add a new row
@@ -73,50 +467,136 @@ class CustomTableWidget(QTableWidget):
                 self.setCurrentCell(current_row + 1, current_col)
             event.accept()
         elif event.key() == Qt.Key_Tab:
-            current_row = self.currentRow()
-            current_col = self.currentColumn()
-            if current_col < self.columnCount() - 1:
+            current_row = self.currentIndex().row()
+            current_col = self.currentIndex().column()
+            if current_col < model.columnCount() - 1:
                 self.setCurrentCell(current_row, current_col + 1)
             else:
                 # If it's the last column, move to the first column of the next row
-                if current_row < self.rowCount() - 1:
+                if current_row < model.rowCount() - 1:
                     self.setCurrentCell(current_row + 1, 0)
                 else:
                     # If it's the last row, add a new row
                     self.main_window.addRow()
                     self.setCurrentCell(current_row + 1, 0)
             event.accept()
+        elif event.matches(QKeySequence.Paste):
+            self.insertFromMimeData(QApplication.clipboard().mimeData())
+            event.accept()
         else:
             super().keyPressEvent(event)
 
     def insertFromMimeData(self, source):
-        if source.hasText():
-            text = source.text()
-            rows = text.split('\n')
-            current_row = self.currentRow()
-            current_col = self.currentColumn()
-            for row_data in rows:
-                if row_data.strip() == "":
-                    continue
-                columns = row_data.split('\t')  # Split by tab to handle multiple columns
-                for col_data in columns:
-                    if current_col >= self.columnCount():
-                        self.main_window.addColumn()
-                    self.setItem(current_row, current_col, QTableWidgetItem(col_data))
-                    current_col += 1
-                current_row += 1
-                current_col = self.currentColumn()  # Reset to the starting column for the next row
-                if current_row >= self.rowCount():
-                    self.main_window.addRow()
+        if not source.hasText():
+            return
+        # Parsed once and written as one block; the table grows in a single step
+        block = parse_block(source.text())
+        if not block:
+            return
+        current = self.currentIndex()
+        row, col = max(current.row(), 0), max(current.column(), 0)
+        self.model().writeBlock(row, col, block)
+        print(f"[LOG] Pasted {len(block)} rows, current rows: {self.model().rowCount()}")
+        self.main_window.reportMalformed()
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("SeqMatrix")
         self.setWindowIcon(QIcon("favicon.svg"))
-        self.sequences = {}
+        self.matrix = Matrix(5, 3)
+        self.sequences = self.matrix.sequences
+        self.download_thread = None
+        self.import_thread = None
+        # Real path -> (size, mtime) of every FASTA file indexed into the pool
+        self.imported_files = {}
+        self.prepare_thread = None
+        # Opened once the window has been painted, see finishStartup
+        self.cache = None
+        self.cache_failed = False
+        self.started = False
+        # Downloaded records wait here and are applied to the table a batch at a time
+        self.pending_downloads = []
+        self.download_timer = QTimer(self)
+        self.download_timer.setInterval(100)
+        self.download_timer.timeout.connect(self.flushDownloads)
+        # Created on first use; it loads NumPy
+        self.stats = None
+        self.stats_thread = None
+        # Called with the statistics once the running count has finished
+        self.stats_waiting = []
+        self.project = None
+        self.save_thread = None
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setInterval(AUTOSAVE_INTERVAL * 1000)
+        self.autosave_timer.timeout.connect(self.autosave)
         self.initUI()
         
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.started:
+            self.started = True
+            # Slow initialization waits until the window is on screen
+            QTimer.singleShot(0, self.finishStartup)
+
+    def finishStartup(self):
+        if timing.enabled():
+            timing.logger.info(f"first paint: {time.perf_counter() - STARTED:.3f} s")
+        self.accessionCache()
+
+    def accessionCache(self):
+        """The download cache, or None when it cannot be opened."""
+        # The cache may live on a slow network home directory
+        if self.cache is None and not self.cache_failed:
+            try:
+                self.cache = AccessionCache()
+            except (OSError, sqlite3.Error) as e:
+                # Downloads still work, they are just not kept
+                self.cache_failed = True
+                print(f"[ERROR] Cannot open the download cache, running without it: {e}")
+        return self.cache
+
+    def matrixStats(self):
+        """The statistics of the current matrix, as of the last count (see refreshStats)."""
+        if self.stats is None:
+            from seqmatrix.stats import MatrixStats
+            self.stats = MatrixStats(self.matrix)
+        return self.stats
+
+    def refreshStats(self, then=None):
+        """Count the sequences that are new since the last count off the UI thread, then call ``then(stats)``.
+
+        Returns True when ``then`` has to wait for a count in the background.
+        """
+        if then is not None:
+            self.stats_waiting.append(then)
+        if self.stats_thread is not None and self.stats_thread.isRunning():
+            return True
+        stats = self.matrixStats()
+        todo = stats.changed()
+        if todo:
+            self.stats_thread = StatsThread(stats, todo, self)
+            self.stats_thread.log_signal.connect(print)
+            self.stats_thread.finished.connect(self.onStatsCounted)
+            self.stats_thread.start()
+            return True
+        waiting, self.stats_waiting = self.stats_waiting, []
+        for callback in waiting:
+            callback(stats)
+        return False
+
+    def onStatsCounted(self):
+        thread = self.sender()
+        if thread.counts is None:
+            # Those waiting still get an answer, from the figures of the last count
+            waiting, self.stats_waiting = self.stats_waiting, []
+            for callback in waiting:
+                callback(thread.stats)
+            return
+        thread.stats.apply(thread.todo, thread.counts, thread.failures)
+        # Sequences that arrived meanwhile (or a newly opened matrix) are counted before answering
+        self.refreshStats()
+
     def initUI(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -127,18 +607,57 @@ class MainWindow(QMainWindow):
         # Left layout
         left_widget = QWidget()
         left_layout = QVBoxLayout(left_widget)
+        open_project_btn = QPushButton("Open Project")
+        open_project_btn.clicked.connect(self.openProject)
+        save_project_btn = QPushButton("Save Project")
+        save_project_btn.clicked.connect(self.saveProject)
         import_btn = QPushButton("Import FASTA")
         import_btn.clicked.connect(self.importFasta)
         download_btn = QPushButton("Download from NCBI")
         download_btn.clicked.connect(self.downloadFromNCBI)
-        self.seq_list = QListWidget()
+        self.seq_list_model = SequenceListModel(self)
+        self.seq_list = QListView()
+        self.seq_list.setModel(self.seq_list_model)
+        # Rows share one height and are laid out in batches, so huge lists stay responsive
+        self.seq_list.setUniformItemSizes(True)
+        self.seq_list.setLayoutMode(QListView.Batched)
+        self.seq_list.setBatchSize(2000)
+        self.seq_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         # Enable drag
         self.seq_list.setDragEnabled(True)
-        self.seq_list.setDragDropMode(QListWidget.DragOnly)
+        self.seq_list.setDragDropMode(QAbstractItemView.DragOnly)
+        filter_layout = QHBoxLayout()
+        self.seq_filter = QLineEdit()
+        self.seq_filter.setPlaceholderText("Filter sequences")
+        self.seq_filter.setClearButtonEnabled(True)
+        self.seq_filter_regex = QCheckBox("Regex")
+        self.seq_filter.textChanged.connect(self.filterSequences)
+        self.seq_filter_regex.toggled.connect(self.filterSequences)
+        filter_layout.addWidget(self.seq_filter)
+        filter_layout.addWidget(self.seq_filter_regex)
+        
+        self.cancel_download_btn = QPushButton("Cancel Download")
+        self.cancel_download_btn.clicked.connect(self.cancelDownload)
+        self.cancel_download_btn.hide()
         
+        project_layout = QHBoxLayout()
+        project_layout.addWidget(open_project_btn)
+        project_layout.addWidget(save_project_btn)
+        left_layout.addLayout(project_layout)
         left_layout.addWidget(import_btn)
         left_layout.addWidget(download_btn)
+        self.import_progress = QProgressBar()
+        self.import_progress.hide()
+        left_layout.addWidget(self.import_progress)
+        self.download_progress = QProgressBar()
+        self.download_progress.hide()
+        self.download_status = QLabel()
+        self.download_status.hide()
+        left_layout.addWidget(self.download_progress)
+        left_layout.addWidget(self.download_status)
+        left_layout.addWidget(self.cancel_download_btn)
         left_layout.addWidget(QLabel("Available Sequences:"))
+        left_layout.addLayout(filter_layout)
         left_layout.addWidget(self.seq_list)
         
         # Right layout
@@ -151,6 +670,15 @@ class MainWindow(QMainWindow):
         rename_col_btn = QPushButton("Rename Column")
         export_btn = QPushButton("Export Files")
         format_btn = QPushButton("Format Cells")
+        auto_assign_btn = QPushButton("Auto Assign")
+        stats_btn = QPushButton("Statistics")
+        extract_btn = QPushButton("Extract Genes")
+        extract_btn.setToolTip("Fill the partitions named after genes with the CDS/rRNA/tRNA features "
+                               "of mitogenomes, plastomes and other multi-gene records")
+        # Optional pre-export stage, see seqmatrix.prepare
+        self.prepare_check = QCheckBox("Orient && Trim")
+        self.prepare_check.setToolTip("Reverse-complement and trim each partition's sequences "
+                                      "to its median-length sequence before exporting")
         
         add_row_btn.clicked.connect(self.addRow)
         add_col_btn.clicked.connect(self.addColumn)
@@ -158,17 +686,25 @@ class MainWindow(QMainWindow):
         rename_col_btn.clicked.connect(self.renameColumn)
         export_btn.clicked.connect(self.exportFiles)
         format_btn.clicked.connect(self.formatCells)
+        auto_assign_btn.clicked.connect(self.autoAssign)
+        extract_btn.clicked.connect(self.extractGenes)
+        stats_btn.clicked.connect(self.showStatistics)
         
         table_controls.addWidget(add_row_btn)
         table_controls.addWidget(add_col_btn)
         table_controls.addWidget(rename_row_btn)
         table_controls.addWidget(rename_col_btn)
         table_controls.addWidget(export_btn)
+        table_controls.addWidget(self.prepare_check)
         table_controls.addWidget(format_btn)
+        table_controls.addWidget(auto_assign_btn)
+        table_controls.addWidget(extract_btn)
+        table_controls.addWidget(stats_btn)
         
-        self.table = CustomTableWidget(self)
-        self.table.setRowCount(5)
-        self.table.setColumnCount(3)
+        self.table = CustomTableView(self)
+        self.table_model = MatrixTableModel(self.matrix, self)
+        self.table_model.cells_dropped.connect(self.onCellsDropped)
+        self.table.setModel(self.table_model)
         
         # 设置表格内容的字体大小
         font = self.table.font()
@@ -177,13 +713,7 @@ class MainWindow(QMainWindow):
         
         # Enable drop
         self.table.setAcceptDrops(True)
-        self.table.setDragDropMode(QTableWidget.DropOnly)
-        
-        # Initialize table headers
-        for i in range(self.table.columnCount()):
-            self.table.setHorizontalHeaderItem(i, QTableWidgetItem(f"Partition_{i+1}"))
-        for i in range(self.table.rowCount()):
-            self.table.setVerticalHeaderItem(i, QTableWidgetItem(f"Sequence_{i+1}"))
+        self.table.setDragDropMode(QAbstractItemView.DropOnly)
         
         # Connect double-click signals to rename functions
         self.table.horizontalHeader().sectionDoubleClicked.connect(self.renameColumn)
@@ -205,273 +735,404 @@ class MainWindow(QMainWindow):
 
         # Enable drag for the sequence list
         self.seq_list.setDragEnabled(True)
-        self.seq_list.setDragDropMode(QListWidget.DragOnly)
+        self.seq_list.setDragDropMode(QAbstractItemView.DragOnly)
         
         # Enable drop for the table
         self.table.setAcceptDrops(True)
-        self.table.setDragDropMode(QTableWidget.DropOnly)
+        self.table.setDragDropMode(QAbstractItemView.DropOnly)
+        self.table.setDragDropOverwriteMode(True)
         self.table.viewport().setAcceptDrops(True)  # Ensure the viewport accepts drops
 
-        # Install event filter if necessary
-        self.table.installEventFilter(self)
-
     def formatCells(self):
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    text = item.text()
-                    lines = text.split('\n')
-                    # Ensure there are enough rows to accommodate the lines
-                    while row + len(lines) > self.table.rowCount():
-                        self.addRow()
-                    for i, line in enumerate(lines):
-                        if i == 0:
-                            item.setText(line)  # Set the first line in the current cell
-                        else:
-                            # Move subsequent lines to the cells below
-                            self.table.setItem(row + i, col, QTableWidgetItem(line))
+        # The first line stays in its cell, the rest move to the cells below;
+        # the table is grown and redrawn once however many lines there are
+        self.table_model.beginResetModel()
+        split = self.matrix.split_cells()
+        self.table_model.endResetModel()
+        print(f"[LOG] Split {split} cells, current rows: {self.matrix.row_count}")
+        self.reportMalformed()
+
+    def reportMalformed(self):
+        malformed = self.matrix.malformed()
+        if malformed:
+            shown = ", ".join(malformed[:10]) + (", ..." if len(malformed) > 10 else "")
+            print(f"[ERROR] {len(malformed)} cells are not accession numbers or loaded sequences: {shown}")
+
+    def autoAssign(self):
+        # Place the listed (filtered) sequences by voucher/strain/isolate and gene name
+        model = self.seq_list_model
+        labels = [model.label(row) for row in range(model.rowCount())]
+        self.table_model.beginResetModel()
+        # Specimen qualifiers are known for records whose GenBank entry was parsed, e.g. by Extract Genes
+        result = auto_assign(self.matrix, with_qualifiers(labels, self.accessionCache()))
+        self.table_model.endResetModel()
+        print(f"[LOG] Auto-assigned {result.assigned} sequences, {len(result.conflicts)} conflicts, "
+              f"{len(result.unassigned)} without voucher or gene name")
+        for conflict in result.conflicts:
+            print(f"[CONFLICT] {conflict.row} / {conflict.column}: kept {conflict.existing}, skipped {conflict.label}")
+        if result.conflicts:
+            shown = "\n".join(f"{c.row} / {c.column}: {c.label}" for c in result.conflicts[:20])
+            more = f"\n... and {len(result.conflicts) - 20} more" if len(result.conflicts) > 20 else ""
+            QMessageBox.warning(self, "Auto Assign",
+                                f"{len(result.conflicts)} sequences were not assigned because their cell "
+                                f"already holds another sequence:\n\n{shown}{more}")
+
+    def extractGenes(self):
+        if self.download_thread is not None and self.download_thread.isRunning():
+            print("[LOG] A download is already running")
+            return
+        accessions = cell_accessions(self.matrix)
+        if not accessions:
+            print("[LOG] No downloaded records to extract genes from; press Download from NCBI first")
+            return
+        # The feature tables need the GenBank records; each is downloaded and parsed once, then cached
+        fetcher = NCBIFetcher(email=NCBI_EMAIL, api_key=NCBI_API_KEY, cache=self.accessionCache())
+        self.download_thread = FeatureThread(accessions, fetcher)
+        self.download_thread.log_signal.connect(print)
+        self.download_thread.progress_signal.connect(self.onDownloadProgress)
+        self.download_thread.finished.connect(self.onFeaturesFetched)
+        self.download_started = time.monotonic()
+        self.download_progress.setRange(0, len(accessions))
+        self.download_progress.setValue(0)
+        self.download_status.setText(f"0 / {len(accessions)}")
+        for widget in (self.download_progress, self.download_status, self.cancel_download_btn):
+            widget.show()
+        self.cancel_download_btn.setEnabled(True)
+        self.download_thread.start()
+
+    def onFeaturesFetched(self):
+        for widget in (self.download_progress, self.download_status, self.cancel_download_btn):
+            widget.hide()
+        index = FeatureIndex()
+        for record, features in self.sender().records.values():
+            index.add(record.id, features)
+        pooled = len(self.matrix.labels)
+        self.table_model.beginResetModel()
+        result = extract_genes(self.matrix, index)
+        self.table_model.endResetModel()
+        self.seq_list_model.appendLabels(label for label in self.matrix.labels[pooled:] if label in self.sequences)
+        print(f"[LOG] Extracted {result.filled} genes from {len(index)} records into "
+              f"{self.matrix.column_count} partitions ({result.columns_added} added), "
+              f"{result.missing} genes missing from their records")
+        for conflict in result.conflicts:
+            print(f"[CONFLICT] {conflict.row} / {conflict.column}: kept {conflict.existing}, skipped {conflict.label}")
 
     def downloadFromNCBI(self):
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    accession = item.text().strip()
-                    if accession:
-                        try:
-                            with Entrez.efetch(db="nucleotide", id=accession, rettype="gb", retmode="text") as handle:
-                                record = SeqIO.read(handle, "genbank")
-                                full_id = record.id + " " + record.description[len(record.id):].strip()
-                                self.sequences[full_id] = str(record.seq)
-                                self.seq_list.addItem(SequenceItem(full_id, str(record.seq)))
-                                # Update the table cell with the full sequence ID
-                                item.setText(full_id)
-                                print(f"[LOG] Downloaded sequence: {full_id}")
-                        except Exception as e:
-                            print(f"[ERROR] Failed to download {accession}: {e}")
-        
-        self.download_thread = DownloadThread(self.sequences, self.table)
+        if self.download_thread is not None and self.download_thread.isRunning():
+            print("[LOG] A download is already running")
+            return
+        # Cells that are neither accessions, ranges nor queries are reported, not sent
+        self.reportMalformed()
+        accessions = self.matrix.fetchable()
+        if not accessions:
+            return
+
+        # A cancelled run resumes from here: finished records are cache hits and
+        # already relabelled cells are no longer unresolved
+        fetcher = NCBIFetcher(email=NCBI_EMAIL, api_key=NCBI_API_KEY, cache=self.accessionCache())
+        self.download_thread = DownloadThread(accessions, fetcher)
+        self.download_thread.log_signal.connect(print)
+        self.download_thread.record_signal.connect(self.onSequenceDownloaded)
+        self.download_thread.progress_signal.connect(self.onDownloadProgress)
+        self.download_thread.expanded_signal.connect(self.onAccessionsExpanded)
+        self.download_thread.finished.connect(self.onDownloadFinished)
+        self.download_started = time.monotonic()
+        self.download_progress.setRange(0, len(accessions))
+        self.download_progress.setValue(0)
+        self.download_status.setText(f"0 / {len(accessions)}")
+        for widget in (self.download_progress, self.download_status, self.cancel_download_btn):
+            widget.show()
+        self.cancel_download_btn.setEnabled(True)
+        self.download_timer.start()
         self.download_thread.start()
 
-    def dragEnterEvent(self, event):
-        if event.mimeData().hasText():
-            event.accept()
-        else:
-            event.ignore()
+    def cancelDownload(self):
+        if self.download_thread is not None and self.download_thread.isRunning():
+            self.cancel_download_btn.setEnabled(False)
+            self.download_thread.cancel()
 
-    def dragMoveEvent(self, event):
-        if event.mimeData().hasText():
-            event.accept()
-        else:
-            event.ignore()
+    def onSequenceDownloaded(self, accession, full_id, sequence):
+        self.pending_downloads.append((accession, full_id, sequence))
 
-    def dropEvent(self, event):
-        if event.mimeData().hasText():
-            pos = event.pos()
-            row = self.table.rowAt(pos.y())
-            col = self.table.columnAt(pos.x())
-            
-            # Check if the drop is within a valid cell
-            if row >= 0 and col >= 0 and row < self.table.rowCount() and col < self.table.columnCount():
-                # Get dragged sequence item
-                source_item = self.seq_list.currentItem()
-                if source_item:
-                    new_item = QTableWidgetItem(source_item.text())
-                    # Store the sequence in the item's data
-                    new_item.setData(Qt.UserRole, source_item.sequence)
-                    self.table.setItem(row, col, new_item)
-                    print(f"[LOG] Added sequence {source_item.text()} to position ({row}, {col})")
-                    # Print the current dataset after each successful drop
-                    self.printCurrentDataset()
-                event.accept()
-            else:
-                event.ignore()
-        else:
-            event.ignore()
+    def flushDownloads(self):
+        # One model update per tick however many records arrived since the last one
+        if not self.pending_downloads:
+            return
+        pending, self.pending_downloads = self.pending_downloads, []
+        new_labels = []
+        for accession, full_id, sequence in pending:
+            if full_id not in self.sequences:
+                new_labels.append(full_id)
+            self.sequences[full_id] = sequence
+            # Update the table cells with the full sequence ID
+            self.matrix.relabel(accession, full_id)
+        self.seq_list_model.appendLabels(new_labels)
+        self.table_model.labelsChanged()
+        self.reportCollisions()
+
+    def onAccessionsExpanded(self, text, full_ids):
+        # The records arrived before this signal; put them in the pool, then
+        # spread them over new rows of the range's or query's column
+        self.flushDownloads()
+        if not full_ids:
+            return
+        self.table_model.beginResetModel()
+        added = self.matrix.expand(text, full_ids)
+        self.table_model.endResetModel()
+        print(f"[LOG] Expanded {text} into {len(full_ids)} sequences, {added} new rows")
+
+    def onDownloadProgress(self, done, total):
+        self.download_progress.setRange(0, total)
+        self.download_progress.setValue(done)
+        elapsed = time.monotonic() - self.download_started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        status = f"{done} / {total}, {rate:.1f} records/s"
+        if rate > 0 and done < total:
+            status += f", about {int((total - done) / rate)} s left"
+        self.download_status.setText(status)
+
+    def onDownloadFinished(self):
+        self.download_timer.stop()
+        self.flushDownloads()
+        for widget in (self.download_progress, self.download_status, self.cancel_download_btn):
+            widget.hide()
+
+    def onCellsDropped(self, row, col, labels):
+        for i, label in enumerate(labels):
+            print(f"[LOG] Added sequence {label} to position ({row + i}, {col})")
+        # Print the current dataset after each successful drop, once its new sequences are counted
+        self.refreshStats(self.printCurrentDataset)
         
     def importFasta(self):
+        if self.import_thread is not None and self.import_thread.isRunning():
+            print("[LOG] An import is already running")
+            return
         files, _ = QFileDialog.getOpenFileNames(self, "Select FASTA files", "", "FASTA files (*.fas *.fasta)")
-        for file in files:
-            for record in SeqIO.parse(file, "fasta"):
-                # Save full sequence ID with spaces
-                full_id = record.id + " " + record.description[len(record.id):].strip()
-                self.sequences[full_id] = str(record.seq)
-                self.seq_list.addItem(SequenceItem(full_id, str(record.seq)))
-                print(f"[LOG] Imported sequence: {full_id}")
+        if not files:
+            return
+        for file in list(files):
+            try:
+                stat = os.stat(file)
+            except OSError:
+                # The import reports it
+                continue
+            if self.imported_files.get(os.path.realpath(file)) == (stat.st_size, stat.st_mtime_ns):
+                print(f"[LOG] {file} is already imported")
+                files.remove(file)
+        if not files:
+            return
+        # Files are indexed off the UI thread; sequences stay on disk until exported
+        self.import_progress.setValue(0)
+        self.import_progress.show()
+        self.import_thread = ImportThread(files, self.sequences.sources())
+        self.import_thread.log_signal.connect(print)
+        self.import_thread.progress_signal.connect(self.import_progress.setValue)
+        self.import_thread.indexed_signal.connect(self.onFastaIndexed)
+        self.import_thread.finished.connect(self.import_progress.hide)
+        self.import_thread.start()
+
+    def onFastaIndexed(self, index):
+        # Records already listed (from an overlapping file) are not listed twice
+        new_labels = [label for label in index.records if label not in self.sequences]
+        self.sequences.add_index(index)
+        self.imported_files[os.path.realpath(index.path)] = index.signature
+        self.seq_list_model.appendLabels(new_labels)
+        self.reportCollisions()
+
+    def reportCollisions(self):
+        for collision in self.sequences.take_collisions():
+            print(f"[CONFLICT] {collision.label}: {collision.old_length}bp sequence replaced "
+                  f"by a different {collision.new_length}bp one")
+
+    def filterSequences(self):
+        try:
+            self.seq_list_model.setFilter(self.seq_filter.text(), self.seq_filter_regex.isChecked())
+        except re.error:
+            # Incomplete regular expression while typing
+            self.seq_filter.setStyleSheet("color: red")
+            return
+        self.seq_filter.setStyleSheet("")
                 
     def addRow(self):
-        current_rows = self.table.rowCount()
-        self.table.setRowCount(current_rows + 1)
-        self.table.setVerticalHeaderItem(current_rows, QTableWidgetItem(f"Sequence_{current_rows+1}"))
-        print(f"[LOG] Added new row, current rows: {current_rows + 1}")
+        self.table_model.insertRows(self.matrix.row_count, 1)
+        print(f"[LOG] Added new row, current rows: {self.matrix.row_count}")
         
     def addColumn(self):
-        current_cols = self.table.columnCount()
-        self.table.setColumnCount(current_cols + 1)
-        self.table.setHorizontalHeaderItem(current_cols, QTableWidgetItem(f"Partition_{current_cols+1}"))
-        print(f"[LOG] Added new column, current columns: {current_cols + 1}")
+        self.table_model.insertColumns(self.matrix.column_count, 1)
+        print(f"[LOG] Added new column, current columns: {self.matrix.column_count}")
 
     def renameRow(self, index=None):
         if index is None:
-            index = self.table.currentRow()
-        if index >= 0 and index < self.table.rowCount():
-            item = self.table.verticalHeaderItem(index)
-            if item:
-                text, ok = QInputDialog.getText(self, "Rename Row", "Enter new name:", 
-                                                text=item.text())
-                if ok and text:
-                    self.table.setVerticalHeaderItem(index, QTableWidgetItem(text))
-                    print(f"[LOG] Renamed row {index + 1} to: {text}")
+            index = self.table.currentIndex().row()
+        if index >= 0 and index < self.matrix.row_count:
+            text, ok = QInputDialog.getText(self, "Rename Row", "Enter new name:", 
+                                            text=self.matrix.row_names[index])
+            if ok and text:
+                self.table_model.setHeaderData(index, Qt.Vertical, text)
+                print(f"[LOG] Renamed row {index + 1} to: {text}")
 
     def renameColumn(self, index=None):
         if index is None:
-            index = self.table.currentColumn()
-        if index >= 0 and index < self.table.columnCount():
-            item = self.table.horizontalHeaderItem(index)
-            if item:
-                text, ok = QInputDialog.getText(self, "Rename Column", "Enter new name:",
-                                                text=item.text())
-                if ok and text:
-                    self.table.setHorizontalHeaderItem(index, QTableWidgetItem(text))
-                    print(f"[LOG] Renamed column {index + 1} to: {text}")
+            index = self.table.currentIndex().column()
+        if index >= 0 and index < self.matrix.column_count:
+            text, ok = QInputDialog.getText(self, "Rename Column", "Enter new name:",
+                                            text=self.matrix.column_names[index])
+            if ok and text:
+                self.table_model.setHeaderData(index, Qt.Horizontal, text)
+                print(f"[LOG] Renamed column {index + 1} to: {text}")
                 
-    def printCurrentDataset(self):
+    def printCurrentDataset(self, stats):
+        partitions = stats.partitions()
         print("\n[CURRENT DATASET]")
-        for row in range(self.table.rowCount()):
-            row_data = []
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    sequence = item.data(Qt.UserRole)
-                    if sequence:
-                        row_data.append(f"{len(sequence)}bp")
-                    else:
-                        row_data.append("empty")
-                else:
-                    row_data.append("empty")
-            print(f"Row {row+1}: {' | '.join(row_data)}")
+        for partition in partitions:
+            print(f"{partition.name}: {partition.sequences} sequences, "
+                  f"{partition.min_length}-{partition.max_length}bp (median {partition.median_length:g}bp)")
+        stats = self.sequences.stats()
+        print(f"[LOG] {stats.labels} sequences ({stats.indexed} read from files); "
+              f"{stats.in_memory} in memory share {stats.unique} distinct sequences, "
+              f"{stats.stored_bytes / 1e6:.1f} MB instead of {stats.logical_bytes / 1e6:.1f} MB")
         print()
         
+    def showStatistics(self):
+        self.refreshStats(lambda stats: StatisticsDialog(stats, self).exec_())
+
     def exportFiles(self):
-        self.printCurrentDataset()
-        try:
-            save_dir = QFileDialog.getExistingDirectory(self, "Select Save Directory")
-            if not save_dir:
+        dialog = None
+
+        def on_counted(stats):
+            if dialog is not None:
+                dialog.close()
+            self.printCurrentDataset(stats)
+            self.confirmExport(stats)
+
+        if self.refreshStats(on_counted):
+            # Modal, so the matrix is not edited while its sequences are read
+            dialog = QProgressDialog("Counting sequences...", None, 0, 0, self)
+            dialog.setWindowModality(Qt.WindowModal)
+            dialog.show()
+
+    def confirmExport(self, stats):
+        outliers = stats.outliers()
+        if outliers:
+            shown = "\n".join(f"{o.row} / {o.column}: {o.length}bp, median {o.median_length:g}bp"
+                              for o in outliers[:20])
+            more = f"\n... and {len(outliers) - 20} more" if len(outliers) > 20 else ""
+            reply = QMessageBox.question(self, "Export Files",
+                                         f"{len(outliers)} sequences are far off the usual length of their "
+                                         f"partition and may be in the wrong column:\n\n{shown}{more}\n\n"
+                                         "Export anyway?",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
                 return
-                
+        save_dir = QFileDialog.getExistingDirectory(self, "Select Save Directory")
+        if not save_dir:
+            return
+        if not self.prepare_check.isChecked():
+            self.writeExport(self.matrix, save_dir)
+            return
+
+        # Partitions are processed in worker processes; the modal dialog keeps
+        # the matrix from being edited meanwhile
+        dialog = QProgressDialog("Orienting and trimming partitions...", None, 0, self.matrix.column_count, self)
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        thread = PrepareThread(self.matrix, self)
+        thread.log_signal.connect(print)
+        thread.progress_signal.connect(lambda done, total: (dialog.setMaximum(total), dialog.setValue(done)))
+
+        def on_finished():
+            dialog.close()
+            if thread.prepared is not None:
+                self.writeExport(thread.prepared, save_dir)
+
+        thread.finished.connect(on_finished)
+        self.prepare_thread = thread
+        thread.start()
+
+    def writeExport(self, matrix, save_dir):
+        try:
             # Export individual gene files
-            for col in range(self.table.columnCount()):
-                sequences = []
-                partition_item = self.table.horizontalHeaderItem(col)
-                partition_name = partition_item.text() if partition_item else f"Partition_{col+1}"
-                has_sequences = False
-                
-                for row in range(self.table.rowCount()):
-                    item = self.table.item(row, col)
-                    if item:
-                        sequence_name = item.text()
-                        sequence = self.sequences.get(sequence_name)
-                        if sequence:
-                            row_item = self.table.verticalHeaderItem(row)
-                            row_name = row_item.text() if row_item else f"Sequence_{row+1}"
-                            sequences.append(f">{row_name}\n{sequence}\n")
-                            has_sequences = True
-                
-                if has_sequences:
-                    file_path = os.path.join(save_dir, f"{partition_name}.fas")
-                    with open(file_path, "w", encoding='utf-8') as f:
-                        f.writelines(sequences)
-                    print(f"[LOG] Exported partition file: {file_path}")
-                        
-            # Export NEXUS file
-        #     nexus_path = os.path.join(save_dir, "concatenated.nex")
-        #     with open(nexus_path, "w", encoding='utf-8') as f:
-        #         f.write("#NEXUS\n")
-        #         f.write("BEGIN DATA;\n")
-                
-        #         # Calculate total chars and get sequence lengths
-        #         total_chars = 0
-        #         col_lengths = []
-        #         for col in range(self.table.columnCount()):
-        #             col_len = 0
-        #             for row in range(self.table.rowCount()):
-        #                 item = self.table.item(row, col)
-        #                 if item:
-        #                     sequence_name = item.text()
-        #                     sequence = self.sequences.get(sequence_name)
-        #                     if sequence:
-        #                         col_len = len(sequence)
-        #                         break
-        #             col_lengths.append(col_len)
-        #             total_chars += col_len
-                
-        #         # Get valid sequence count
-        #         valid_rows = 0
-        #         for row in range(self.table.rowCount()):
-        #             for col in range(self.table.columnCount()):
-        #                 item = self.table.item(row, col)
-        #                 if item and self.sequences.get(item.text()):
-        #                     valid_rows += 1
-        #                     break
-                            
-        #         f.write(f"DIMENSIONS NTAX={valid_rows} NCHAR={total_chars};\n")
-        #         f.write("FORMAT DATATYPE=DNA MISSING=? GAP=-;\n")
-        #         f.write("MATRIX\n")
-                
-        #         # Output sequence matrix
-        #         for row in range(self.table.rowCount()):
-        #             seq = ""
-        #             has_sequence = False
-        #             for col in range(self.table.columnCount()):
-        #                 item = self.table.item(row, col)
-        #                 if item:
-        #                     sequence_name = item.text()
-        #                     sequence = self.sequences.get(sequence_name)
-        #                     if sequence:
-        #                         seq += sequence
-        #                         has_sequence = True
-        #                     else:
-        #                         seq += "?" * col_lengths[col]  # Fill with '?' for missing genes
-        #                 else:
-        #                     seq += "?" * col_lengths[col]  # Fill with '?' for missing genes
-                    
-        #             row_item = self.table.verticalHeaderItem(row)
-        #             row_name = row_item.text() if row_item else f"Sequence_{row+1}"
-        #             if has_sequence:  # Only output rows with at least one sequence
-        #                 f.write(f"{row_name:<30} {seq}\n")
-                        
-        #         f.write(";\nEND;\n")
-                
-        #         # Add partition information
-        #         f.write("\nBEGIN SETS;\n")
-        #         start = 1
-        #         for col in range(self.table.columnCount()):
-        #             if col_lengths[col] > 0:  # Only output partitions with sequences
-        #                 end = start + col_lengths[col] - 1
-        #                 partition_item = self.table.horizontalHeaderItem(col)
-        #                 partition_name = partition_item.text() if partition_item else f"Partition_{col+1}"
-        #                 f.write(f"CHARSET {partition_name} = {start}-{end};\n")
-        #                 start = end + 1
-        #         f.write("END;\n")
-                
-        #     print(f"[LOG] Exported NEXUS file: {nexus_path}")
+            for file_path in matrix.export_partitions(save_dir):
+                print(f"[LOG] Exported partition file: {file_path}")
+
+            # Export the concatenated NEXUS/PHYLIP files and the partition file
+            for file_path in matrix.export_supermatrix(save_dir):
+                print(f"[LOG] Exported supermatrix file: {file_path}")
             
         except Exception as e:
             print(f"[ERROR] Error exporting files: {str(e)}")
 
-    def eventFilter(self, source, event):
-        if event.type() == QEvent.Drop and source is self.table.viewport():
-            # Handle drop event only if it's on a valid cell
-            pos = event.pos()
-            row = self.table.rowAt(pos.y())
-            col = self.table.columnAt(pos.x())
-            if row >= 0 and col >= 0 and row < self.table.rowCount() and col < self.table.columnCount():
-                return False  # Allow the drop event to be processed
-            else:
-                event.ignore()
-                return True
-        return super(MainWindow, self).eventFilter(source, event)
+    def setMatrix(self, matrix):
+        self.matrix = matrix
+        self.sequences = matrix.sequences
+        self.imported_files = {}
+        self.stats = None
+        self.table_model.beginResetModel()
+        self.table_model.matrix = matrix
+        self.table_model.endResetModel()
+        self.seq_list_model.setLabels(self.sequences)
+
+    def busy(self):
+        threads = (self.download_thread, self.import_thread, self.save_thread, self.prepare_thread,
+                   self.stats_thread)
+        return any(thread is not None and thread.isRunning() for thread in threads)
+
+    def openProject(self):
+        if self.busy():
+            print("[LOG] Wait for the running download, import or save to finish")
+            return
+        path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", f"SeqMatrix projects (*{PROJECT_SUFFIX})")
+        if not path:
+            return
+        try:
+            project = ProjectFile(path)
+            matrix = project.load()
+        except Exception as e:
+            print(f"[ERROR] Error opening project: {e}")
+            return
+        if self.project is not None:
+            self.project.close()
+        # Only the grid is read here; sequences are paged in when displayed or exported
+        self.project = project
+        self.setMatrix(matrix)
+        self.setWindowTitle(f"SeqMatrix - {os.path.basename(path)}")
+        self.autosave_timer.start()
+        print(f"[LOG] Opened project {path}: {matrix.row_count} rows, {matrix.column_count} columns, "
+              f"{len(self.sequences)} sequences")
+
+    def saveProject(self):
+        if self.project is None:
+            path, _ = QFileDialog.getSaveFileName(self, "Save Project", "", f"SeqMatrix projects (*{PROJECT_SUFFIX})")
+            if not path:
+                return
+            if not path.lower().endswith(PROJECT_SUFFIX):
+                path += PROJECT_SUFFIX
+            try:
+                if os.path.exists(path):
+                    # The dialog already asked before overwriting
+                    os.remove(path)
+                self.project = ProjectFile(path)
+            except Exception as e:
+                print(f"[ERROR] Error saving project: {e}")
+                return
+            self.setWindowTitle(f"SeqMatrix - {os.path.basename(path)}")
+            self.autosave_timer.start()
+        self.autosave()
+
+    def autosave(self):
+        # Only what changed since the last save is written, off the UI thread
+        if self.project is None or (self.save_thread is not None and self.save_thread.isRunning()):
+            return
+        self.save_thread = ProjectSaveThread(self.project, self.project.snapshot(self.matrix))
+        self.save_thread.log_signal.connect(print)
+        self.save_thread.finished.connect(self.onProjectSaved)
+        self.save_thread.start()
+
+    def onProjectSaved(self):
+        thread = self.sender()
+        if thread.saved and thread.project is self.project:
+            # Saved sequences are read back from the project instead of being kept in memory
+            self.project.adopt(self.sequences, thread.snapshot)
 
     def closeEvent(self, event):
         reply = QMessageBox.question(self, '确认退出',
@@ -479,11 +1140,26 @@ class MainWindow(QMainWindow):
                                      QMessageBox.Yes | QMessageBox.No,
                                      QMessageBox.No)
         if reply == QMessageBox.Yes:
+            if self.download_thread is not None:
+                self.download_thread.cancel()
+            for thread in (self.download_thread, self.import_thread, self.save_thread, self.prepare_thread,
+                           self.stats_thread):
+                if thread is not None:
+                    thread.wait()
+            if self.project is not None:
+                self.autosave_timer.stop()
+                self.project.save(self.matrix)
+                self.project.close()
+            if self.cache is not None:
+                self.cache.close()
             event.accept()
         else:
             event.ignore()
 
 if __name__ == '__main__':
+    # SEQMATRIX_TIMING=1 logs the duration and throughput of every stage
+    if timing.enabled():
+        logging.basicConfig(level=logging.INFO, format="[TIME] %(message)s")
     app = QApplication(sys.argv)
     window = MainWindow()
     window.resize(800, 600)
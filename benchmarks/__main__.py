@@ -0,0 +1,21 @@
+"""Run every benchmark once with per-stage timings: python -m benchmarks"""
+import logging
+
+from benchmarks import (bench_export, bench_features, bench_fetch, bench_format, bench_import, bench_prepare,
+                        bench_startup)
+from seqmatrix import timing
+
+
+def main():
+    timing.enable()
+    for module in (bench_startup, bench_import, bench_fetch, bench_features, bench_format, bench_prepare, bench_export):
+        print(f"# {module.__name__}")
+        timing.reset()
+        module.main()
+        for line in timing.report():
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,48 @@
+"""Partition and supermatrix export of filled matrices of increasing size.
+
+Usable from asv, or directly:
+
+    python -m benchmarks.bench_export
+"""
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import filled_matrix
+
+
+class Export:
+    params = ([200, 2000], [10, 60])
+    param_names = ["rows", "columns"]
+
+    def setup(self, rows, columns):
+        self.matrix = filled_matrix(rows, columns)
+        self.directory = tempfile.mkdtemp()
+
+    def teardown(self, rows, columns):
+        shutil.rmtree(self.directory)
+
+    def time_partitions(self, rows, columns):
+        self.matrix.export_partitions(self.directory)
+
+    def time_supermatrix(self, rows, columns):
+        self.matrix.export_supermatrix(self.directory)
+
+
+def main():
+    bench = Export()
+    for rows in Export.params[0]:
+        for columns in Export.params[1]:
+            bench.setup(rows, columns)
+            start = time.perf_counter()
+            bench.time_partitions(rows, columns)
+            partitions = time.perf_counter() - start
+            start = time.perf_counter()
+            bench.time_supermatrix(rows, columns)
+            supermatrix = time.perf_counter() - start
+            bench.teardown(rows, columns)
+            print(f"{rows:>5} x {columns:>2}: partitions {partitions:6.3f} s, supermatrix {supermatrix:6.3f} s")
+
+
+if __name__ == "__main__":
+    main()
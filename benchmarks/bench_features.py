@@ -0,0 +1,80 @@
+"""Gene extraction from mitogenome-sized GenBank records.
+
+The first pass downloads (from the local efetch stand-in) and parses the
+GenBank records; later passes read their features from the accession cache.
+Usable from asv, or directly:
+
+    python -m benchmarks.bench_features
+"""
+import time
+
+from benchmarks.synthetic import organellar_record
+from seqmatrix.cache import AccessionCache
+from seqmatrix.features import FeatureIndex, cell_accessions, extract_genes
+from seqmatrix.matrix import Matrix
+from seqmatrix.ncbi import NCBIFetcher
+from seqmatrix.stubserver import StubEutilsServer
+
+
+def genome_matrix(records):
+    """One row per genome, resolved as the lean download leaves it."""
+    matrix = Matrix(0, 0)
+    matrix.resize(len(records), 1)
+    for row, record in enumerate(records):
+        label = f"{record.id} {record.description}"
+        matrix.sequences[label] = str(record.seq)
+        matrix.set_cell(row, 0, label)
+    return matrix
+
+
+class GeneExtraction:
+    params = [100, 1000]
+    param_names = ["records"]
+    timeout = 300
+
+    def setup(self, records):
+        self.records = [organellar_record(f"MT{100000 + i}", seed=i) for i in range(records)]
+        self.server = StubEutilsServer(self.records).start()
+        self.cache = AccessionCache(":memory:")
+        self.accessions = [record.name for record in self.records]
+        self.fetcher().fetch_features(self.accessions)
+
+    def teardown(self, records):
+        self.cache.close()
+        self.server.stop()
+
+    def fetcher(self, cache=True):
+        return NCBIFetcher(base_url=self.server.url, requests_per_second=1000,
+                           cache=self.cache if cache else None)
+
+    def time_download_and_parse(self, records):
+        self.fetcher(cache=False).fetch_features(self.accessions)
+
+    def time_cached_features(self, records):
+        self.fetcher().fetch_features(self.accessions)
+
+    def time_extract(self, records):
+        matrix = genome_matrix(self.records)
+        found, _ = self.fetcher().fetch_features(cell_accessions(matrix))
+        index = FeatureIndex()
+        for record, features in found.values():
+            index.add(record.id, features)
+        extract_genes(matrix, index)
+
+
+def main():
+    bench = GeneExtraction()
+    for records in GeneExtraction.params:
+        bench.setup(records)
+        timings = []
+        for method in (bench.time_download_and_parse, bench.time_cached_features, bench.time_extract):
+            start = time.perf_counter()
+            method(records)
+            timings.append(time.perf_counter() - start)
+        bench.teardown(records)
+        print(f"{records:>5} genomes: download + parse {timings[0]:6.2f} s, cached features {timings[1]:6.2f} s, "
+              f"cached features + extract {timings[2]:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Lean (FASTA) versus full (GenBank) downloads of large organellar records,
+and barcode downloads with and without the accession cache.
+
+Runs against the local efetch stand-in, so it measures bytes transferred and
+parse cost rather than network latency. Usable from asv, or directly:
+
+    python -m benchmarks.bench_fetch
+"""
+import time
+
+from benchmarks.synthetic import barcode_record, organellar_record
+from seqmatrix.cache import AccessionCache
+from seqmatrix.ncbi import NCBIFetcher
+from seqmatrix.stubserver import StubEutilsServer
+
+
+class FetchModes:
+    params = ([True, False], [50, 200])
+    param_names = ["lean", "records"]
+
+    def setup(self, lean, records):
+        self.accessions = [f"MT{100000 + i}" for i in range(records)]
+        self.server = StubEutilsServer(organellar_record(accession, seed=i)
+                                       for i, accession in enumerate(self.accessions)).start()
+        self.fetcher = NCBIFetcher(base_url=self.server.url, requests_per_second=1000, lean=lean)
+
+    def teardown(self, lean, records):
+        self.server.stop()
+
+    def time_fetch(self, lean, records):
+        self.fetcher.fetch(self.accessions)
+
+    def track_bytes(self, lean, records):
+        before = self.server.bytes_sent
+        self.fetcher.fetch(self.accessions)
+        return self.server.bytes_sent - before
+
+
+class FetchCache:
+    params = [100, 1000]
+    param_names = ["records"]
+
+    def setup(self, records):
+        self.accessions = [f"MN{100000 + i}" for i in range(records)]
+        self.server = StubEutilsServer(barcode_record(accession, seed=i)
+                                       for i, accession in enumerate(self.accessions)).start()
+        self.cache = AccessionCache(":memory:")
+        NCBIFetcher(base_url=self.server.url, requests_per_second=1000, cache=self.cache).fetch(self.accessions)
+
+    def teardown(self, records):
+        self.cache.close()
+        self.server.stop()
+
+    def time_uncached(self, records):
+        NCBIFetcher(base_url=self.server.url, requests_per_second=1000).fetch(self.accessions)
+
+    def time_cached(self, records):
+        NCBIFetcher(base_url=self.server.url, requests_per_second=1000, cache=self.cache).fetch(self.accessions)
+
+
+def main():
+    bench = FetchModes()
+    for records in FetchModes.params[1]:
+        for lean in FetchModes.params[0]:
+            bench.setup(lean, records)
+            start = time.perf_counter()
+            sent = bench.track_bytes(lean, records)
+            elapsed = time.perf_counter() - start
+            bench.teardown(lean, records)
+            mode = "fasta" if lean else "gb"
+            print(f"{mode:>5} x {records:>4}: {sent / 1e6:8.2f} MB, {elapsed:6.2f} s")
+    bench = FetchCache()
+    for records in FetchCache.params:
+        bench.setup(records)
+        start = time.perf_counter()
+        bench.time_uncached(records)
+        uncached = time.perf_counter() - start
+        start = time.perf_counter()
+        bench.time_cached(records)
+        cached = time.perf_counter() - start
+        bench.teardown(records)
+        print(f"barcodes x {records:>4}: uncached {uncached:6.2f} s, cached {cached:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
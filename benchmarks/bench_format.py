@@ -0,0 +1,56 @@
+"""Pasting accession tables and splitting multi-line cells (Format Cells).
+
+Usable from asv, or directly:
+
+    python -m benchmarks.bench_format
+"""
+import time
+
+from benchmarks.synthetic import accession_block
+from seqmatrix.matrix import Matrix, parse_block
+
+
+class PasteBlock:
+    params = ([1000, 5000, 20000], [20])
+    param_names = ["rows", "columns"]
+
+    def setup(self, rows, columns):
+        # As a spreadsheet puts it on the clipboard
+        self.text = "\r\n".join("\t".join(row) for row in accession_block(rows, columns)) + "\r\n"
+
+    def time_paste(self, rows, columns):
+        Matrix(5, 3).write_block(0, 0, parse_block(self.text))
+
+
+class FormatCells:
+    params = ([1000, 5000, 20000], [20])
+    param_names = ["rows", "columns"]
+    # Splitting changes the matrix, so every sample needs a fresh one
+    number = 1
+
+    def setup(self, rows, columns):
+        self.matrix = Matrix(5, columns)
+        for col, texts in enumerate(zip(*accession_block(rows, columns))):
+            self.matrix.set_cell(0, col, "\n".join(texts))
+
+    def time_split_cells(self, rows, columns):
+        self.matrix.split_cells()
+
+
+def main():
+    for rows in PasteBlock.params[0]:
+        columns = PasteBlock.params[1][0]
+        paste, split = PasteBlock(), FormatCells()
+        paste.setup(rows, columns)
+        split.setup(rows, columns)
+        start = time.perf_counter()
+        paste.time_paste(rows, columns)
+        pasted = time.perf_counter() - start
+        start = time.perf_counter()
+        split.time_split_cells(rows, columns)
+        formatted = time.perf_counter() - start
+        print(f"{rows:>6} x {columns}: paste {pasted:6.3f} s, format cells {formatted:6.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""FASTA import: indexing files of increasing size and reading every record back.
+
+Usable from asv, or directly:
+
+    python -m benchmarks.bench_import
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import write_fasta
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.matrix import Matrix
+
+
+class FastaImport:
+    params = [1000, 10000, 50000]
+    param_names = ["records"]
+
+    def setup(self, records):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "import.fas")
+        write_fasta(self.path, records)
+
+    def teardown(self, records):
+        shutil.rmtree(self.directory)
+
+    def time_index(self, records):
+        FastaIndex.build(self.path)
+
+    def time_import_and_read(self, records):
+        matrix = Matrix(0, 0)
+        sequences = matrix.sequences
+        for label in matrix.load_fasta(self.path):
+            sequences[label]
+
+    def track_bytes(self, records):
+        return os.path.getsize(self.path)
+
+
+def main():
+    bench = FastaImport()
+    for records in FastaImport.params:
+        bench.setup(records)
+        start = time.perf_counter()
+        bench.time_index(records)
+        indexed = time.perf_counter() - start
+        start = time.perf_counter()
+        bench.time_import_and_read(records)
+        read = time.perf_counter() - start
+        size = bench.track_bytes(records)
+        bench.teardown(records)
+        print(f"{records:>6} records, {size / 1e6:6.1f} MB: index {indexed:6.3f} s, import + read {read:6.3f} s")
+
+
+if __name__ == "__main__":
+    main()
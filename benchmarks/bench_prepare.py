@@ -0,0 +1,44 @@
+"""Orienting and trimming partitions of raw downloads before export.
+
+Usable from asv, or directly:
+
+    python -m benchmarks.bench_prepare
+"""
+import os
+import time
+
+from benchmarks.synthetic import raw_partition_matrix
+from seqmatrix.prepare import prepare
+
+
+class Prepare:
+    params = ([200, 2000], [10, 100])
+    param_names = ["rows", "columns"]
+    timeout = 600
+
+    def setup(self, rows, columns):
+        self.matrix = raw_partition_matrix(rows, columns)
+
+    def time_prepare(self, rows, columns):
+        prepare(self.matrix)
+
+    def time_prepare_one_process(self, rows, columns):
+        prepare(self.matrix, workers=1)
+
+
+def main():
+    bench = Prepare()
+    print(f"{os.cpu_count()} CPUs")
+    for rows in Prepare.params[0]:
+        for columns in Prepare.params[1]:
+            bench.setup(rows, columns)
+            start = time.perf_counter()
+            prepared, reports = prepare(bench.matrix)
+            elapsed = time.perf_counter() - start
+            reversed_ = sum(report.reversed for report in reports)
+            trimmed = sum(report.trimmed for report in reports)
+            print(f"{rows:>5} x {columns:>3}: {elapsed:6.2f} s, {reversed_} reverse-complemented, {trimmed} trimmed")
+
+
+if __name__ == "__main__":
+    main()
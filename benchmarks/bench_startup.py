@@ -0,0 +1,99 @@
+"""GUI startup: import time of SeqMatrix.py and the time until its window is first painted.
+
+Both are measured in fresh interpreters, from launching the process, with
+Qt's offscreen platform and an empty cache directory. Usable from asv, or
+directly:
+
+    python -m benchmarks.bench_startup
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# What a cold start should stay under
+TARGET_SECONDS = 1.0
+
+# Runs in the child: prints once the window has been painted and the deferred initialization has run
+_FIRST_PAINT = """
+import sys
+from PyQt5.QtWidgets import QApplication
+import SeqMatrix
+
+class Probe(SeqMatrix.MainWindow):
+    def finishStartup(self):
+        super().finishStartup()
+        print("painted", flush=True)
+        QApplication.instance().quit()
+
+app = QApplication(sys.argv)
+window = Probe()
+window.resize(800, 600)
+window.show()
+app.exec_()
+"""
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def _run(args, cache_dir):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"),
+               XDG_CACHE_HOME=cache_dir, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(module="SeqMatrix"):
+    """Cumulative import time in seconds of ``module`` and of each module it imports
+    directly, from ``python -X importtime``."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        result = _run(["-X", "importtime", "-c", f"import {module}"], cache_dir)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        # Nesting is shown by two spaces per level
+        if match and len(match.group(3)) <= 2:
+            times[match.group(4)] = int(match.group(2)) / 1e6
+    return times
+
+
+def first_paint():
+    """Seconds from launching the GUI until its window has been painted."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        result = _run(["-c", _FIRST_PAINT], cache_dir)
+        elapsed = time.perf_counter() - start
+    if "painted" not in result.stdout:
+        raise RuntimeError("the window was never painted")
+    return elapsed
+
+
+class Startup:
+    timeout = 60
+
+    def track_import(self):
+        return import_times()["SeqMatrix"]
+
+    track_import.unit = "seconds"
+
+    def track_first_paint(self):
+        return first_paint()
+
+    track_first_paint.unit = "seconds"
+
+
+def main():
+    times = import_times()
+    total = times.pop("SeqMatrix")
+    print(f"import SeqMatrix: {total:.3f} s")
+    for name, seconds in sorted(times.items(), key=lambda item: -item[1])[:8]:
+        print(f"  {name}: {seconds:.3f} s")
+    painted = min(first_paint() for _ in range(3))
+    verdict = "ok" if painted < TARGET_SECONDS else f"over the {TARGET_SECONDS:g} s target"
+    print(f"first paint: {painted:.3f} s ({verdict})")
+
+
+if __name__ == "__main__":
+    main()
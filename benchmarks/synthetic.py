@@ -0,0 +1,108 @@
+"""Deterministic synthetic data for the benchmarks."""
+import random
+
+from Bio.Seq import Seq
+from Bio.SeqFeature import FeatureLocation, SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+from seqmatrix.matrix import Matrix
+
+MITO_GENES = ["ND1", "ND2", "COX1", "COX2", "ATP8", "ATP6", "COX3", "ND3", "ND4L", "ND4", "ND5", "ND6", "CYTB"]
+
+
+def random_sequence(length, rng):
+    return "".join(rng.choices("ACGT", k=length))
+
+
+def barcode_record(accession, length=650, seed=0):
+    """A COI barcode-sized record, as the efetch stand-in serves it."""
+    rng = random.Random(seed)
+    return SeqRecord(Seq(random_sequence(length, rng)), id=f"{accession}.1", name=accession,
+                     description=f"Genus{seed % 200} species voucher V{seed} cytochrome c oxidase subunit I")
+
+
+def organellar_record(accession, length=16500, n_genes=37, seed=0):
+    """A mitogenome-like GenBank record with a CDS/gene feature pair per gene."""
+    rng = random.Random(seed)
+    record = SeqRecord(Seq(random_sequence(length, rng)), id=f"{accession}.1", name=accession,
+                       description=f"Synthetic organism {accession} mitochondrion, complete genome")
+    record.annotations["molecule_type"] = "DNA"
+    record.annotations["topology"] = "circular"
+    record.features.append(SeqFeature(FeatureLocation(0, length, strand=1), type="source", qualifiers={
+        "organism": ["Synthetic organism"], "mol_type": ["genomic DNA"],
+        "specimen_voucher": [f"VOUCHER {seed}"]}))
+    span = length // n_genes
+    for i in range(n_genes):
+        gene = MITO_GENES[i % len(MITO_GENES)] if i < len(MITO_GENES) else f"trn{i}"
+        start, end = i * span, i * span + span - span % 3
+        location = FeatureLocation(start, end, strand=1 if i % 4 else -1)
+        record.features.append(SeqFeature(location, type="gene", qualifiers={"gene": [gene]}))
+        if i < len(MITO_GENES):
+            cds = SeqFeature(location, type="CDS", qualifiers={
+                "gene": [gene], "codon_start": ["1"], "transl_table": ["2"],
+                "product": [f"{gene} protein"], "protein_id": [f"YP_{seed:06d}{i:02d}.1"]})
+            cds.qualifiers["translation"] = [str(cds.extract(record.seq).translate(table=2))]
+            record.features.append(cds)
+        else:
+            record.features.append(SeqFeature(location, type="tRNA", qualifiers={"gene": [gene]}))
+    return record
+
+
+def write_fasta(path, records, length=650, seed=0):
+    """A FASTA file of ``records`` barcode-sized sequences, 60 bases per line; returns its labels."""
+    rng = random.Random(seed)
+    labels = []
+    with open(path, "w") as f:
+        for i in range(records):
+            label = f"MN{100000 + i}.1 Genus{i % 200} species voucher V{i} cytochrome c oxidase subunit I"
+            labels.append(label)
+            sequence = random_sequence(length, rng)
+            f.write(f">{label}\n")
+            for start in range(0, length, 60):
+                f.write(sequence[start:start + 60])
+                f.write("\n")
+    return labels
+
+
+def accession_block(rows, columns, first=0):
+    """Rows of distinct well-formed accessions, as parsed from a pasted table."""
+    return [[f"AB{first + row * columns + col:06d}" for col in range(columns)] for row in range(rows)]
+
+
+def filled_matrix(rows, columns, length=650, distinct=500, seed=0):
+    """A Matrix whose every cell holds one of ``distinct`` in-memory sequences."""
+    rng = random.Random(seed)
+    pool = [random_sequence(length, rng) for _ in range(distinct)]
+    matrix = Matrix(0, 0)
+    matrix.resize(rows, columns)
+    for row in range(rows):
+        for col in range(columns):
+            label = f"S{row}_{col}"
+            matrix.set_cell(row, col, label)
+            matrix.sequences[label] = pool[(row * columns + col) % distinct]
+    return matrix
+
+
+def raw_partition_matrix(rows, columns, length=650, flank=300, seed=0):
+    """A Matrix of raw downloads: each column one locus, with about a third of its
+    sequences reverse-complemented and another third carrying long flanks."""
+    rng = random.Random(seed)
+    complement = str.maketrans("ACGT", "TGCA")
+    flanks = [random_sequence(flank, rng) for _ in range(50)]
+    matrix = Matrix(0, 0)
+    matrix.resize(rows, columns)
+    for col in range(columns):
+        locus = random_sequence(length, rng)
+        for row in range(rows):
+            bases = list(locus)
+            for position in rng.sample(range(length), length // 50):
+                bases[position] = rng.choice("ACGT")
+            sequence = "".join(bases)
+            if row % 3 == 1:
+                sequence = sequence.translate(complement)[::-1]
+            elif row % 3 == 2:
+                sequence = rng.choice(flanks) + sequence + rng.choice(flanks)
+            label = f"S{row}_{col}"
+            matrix.set_cell(row, col, label)
+            matrix.sequences[label] = sequence
+    return matrix
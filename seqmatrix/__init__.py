@@ -0,0 +1,5 @@
+"""Non-GUI building blocks of SeqMatrix.
+
+Nothing in this package imports PyQt5, so it can be used from scripts and
+pipelines as well as from the SeqMatrix window.
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from seqmatrix.cli import main
+
+sys.exit(main())
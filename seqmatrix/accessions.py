@@ -0,0 +1,87 @@
+"""Syntax of nucleotide accession numbers, accession ranges and search queries.
+
+Covers the INSDC formats (GenBank/ENA/DDBJ: 1 letter + 5 digits, 2 letters
++ 6 or 8 digits, WGS/TSA/TLS contig and MGA ids), RefSeq ids such as
+NC_012920 or NZ_CP011113, and plain numeric GI/UIDs, each with an optional
+".version" suffix.
+
+A cell may also hold a range of consecutive accessions (MN123400-MN123499),
+which is expanded locally, or an Entrez query ("COI AND Carabus[ORGN]"),
+which is resolved through ESearch.
+"""
+import re
+from collections import namedtuple
+
+ACCESSION = re.compile(
+    r"^(?:[A-Z]\d{5}|[A-Z]{2}\d{6}|[A-Z]{2}\d{8}"
+    r"|[A-Z]{4}\d{8,10}|[A-Z]{6}\d{9,11}|[A-Z]{5}\d{7}"
+    r"|[A-Z]{2}_[A-Z]{0,4}\d{6,11}"
+    r"|\d{1,12})(?:\.\d+)?$",
+    re.IGNORECASE)
+
+# Both ends spelled out: same prefix, same number of digits
+_RANGE = re.compile(r"^([A-Z]{1,6}_?[A-Z]{0,4})(\d{5,11})\s*-\s*([A-Z]{1,6}_?[A-Z]{0,4})(\d{5,11})$", re.IGNORECASE)
+# Field tags such as [ORGN] or [Gene Name], or upper-case boolean operators
+_QUERY = re.compile(r"\[[A-Za-z][A-Za-z ]*\]|\s(?:AND|OR|NOT)\s")
+
+# Ranges longer than this are almost certainly typing mistakes
+MAX_RANGE = 100000
+
+# accessions: list; ranges: range text -> its accessions; queries: list; failures: text -> error
+CellRequests = namedtuple("CellRequests", ["accessions", "ranges", "queries", "failures"])
+
+
+def is_accession(text):
+    return ACCESSION.match(text) is not None
+
+
+def is_uid(text):
+    """True for a numeric GI/UID, which NCBI records do not carry in their FASTA or GenBank text."""
+    return text.split(".", 1)[0].isdigit()
+
+
+def parse_range(text):
+    """(prefix, first, last, digits) of an accession range, or None."""
+    match = _RANGE.match(text.strip())
+    if match is None:
+        return None
+    prefix, first, other_prefix, last = match.groups()
+    if prefix.upper() != other_prefix.upper() or len(first) != len(last) or int(first) > int(last):
+        return None
+    if not is_accession(prefix + first):
+        return None
+    return prefix.upper(), int(first), int(last), len(first)
+
+
+def is_range(text):
+    return parse_range(text) is not None
+
+
+def expand_range(text):
+    """The accessions of a range, in order; raises ValueError for ranges over MAX_RANGE."""
+    prefix, first, last, digits = parse_range(text)
+    if last - first + 1 > MAX_RANGE:
+        raise ValueError(f"{text} spans {last - first + 1} accessions, more than {MAX_RANGE}")
+    return [f"{prefix}{number:0{digits}d}" for number in range(first, last + 1)]
+
+
+def is_query(text):
+    return not is_accession(text) and _QUERY.search(text) is not None
+
+
+def classify(texts):
+    """Sort cell texts into the accessions, ranges and queries to download; other texts are failures."""
+    accessions, ranges, queries, failures = [], {}, [], {}
+    for text in texts:
+        if is_range(text):
+            try:
+                ranges[text] = expand_range(text)
+            except ValueError as e:
+                failures[text] = str(e)
+        elif is_query(text):
+            queries.append(text)
+        elif is_accession(text):
+            accessions.append(text)
+        else:
+            failures[text] = "not an accession number, range or query"
+    return CellRequests(accessions, ranges, queries, failures)
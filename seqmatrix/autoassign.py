@@ -0,0 +1,137 @@
+"""Place sequences into the matrix by voucher/strain/isolate and gene name.
+
+Each record is reduced to a normalized specimen identifier (its row) and a
+canonical gene name (its column). Rows and columns are looked up in dicts,
+so assigning n records takes one pass over them. A record that lands on a
+cell already holding a different sequence is reported as a conflict and
+the cell is left untouched.
+"""
+import re
+from collections import namedtuple
+
+from seqmatrix.accessions import is_accession
+from seqmatrix.genes import find_genes, normalize_gene
+
+# GenBank source qualifiers naming the specimen, most specific first
+SPECIMEN_QUALIFIERS = ("specimen_voucher", "strain", "isolate", "culture_collection")
+
+_SPECIMEN = re.compile(
+    r"\b(?:specimen[_ ]voucher|voucher|strain|isolate|culture[_ ]collection|culture)\s*[:=]?\s*"
+    r"([A-Za-z0-9][\w.:/\-]*)(?:\s(\d[\w.:/\-]*))?",
+    re.IGNORECASE)
+# "MNHN 12-345", "CBS 123.45", "USNM 1234a": an institution code and its catalogue number
+_INSTITUTION = re.compile(r"^[A-Za-z]+$")
+_CATALOGUE_NUMBER = re.compile(r"^\d+(?:[-.:/]\d+)*[A-Za-z]?$")
+_RRNA = re.compile(r"^\d+(?:\.\d+)?S$", re.IGNORECASE)
+
+_DEFAULT_ROW = re.compile(r"^Sequence_\d+$")
+_DEFAULT_COLUMN = re.compile(r"^Partition_\d+$")
+
+Conflict = namedtuple("Conflict", ["row", "column", "existing", "label"])
+AssignResult = namedtuple("AssignResult", ["assigned", "conflicts", "unassigned"])
+
+
+def normalize_specimen(identifier):
+    # "MNHN 12-345", "mnhn12345" and "MNHN:12345" are the same specimen
+    return re.sub(r"[^0-9A-Z]", "", identifier.upper())
+
+
+def source_qualifiers(record):
+    """Specimen qualifiers of the source feature of a Bio.SeqRecord from GenBank."""
+    for feature in record.features:
+        if feature.type == "source":
+            return {key: values[0] for key, values in feature.qualifiers.items() if key in SPECIMEN_QUALIFIERS}
+    return {}
+
+
+def with_qualifiers(labels, cache=None):
+    """``(label, qualifiers)`` pairs for auto_assign(), with the source qualifiers
+    ``cache`` (an AccessionCache) holds for records downloaded as GenBank."""
+    labels = list(labels)
+    ids = {label.split(" ", 1)[0] for label in labels}
+    sources = cache.get_sources(i for i in ids if is_accession(i)) if cache is not None else {}
+    return [(label, sources.get(label.split(" ", 1)[0])) for label in labels]
+
+
+def specimen_of(description, qualifiers=None):
+    """The specimen identifier of a record as written, or None."""
+    if qualifiers:
+        for key in SPECIMEN_QUALIFIERS:
+            if qualifiers.get(key):
+                return qualifiers[key]
+    match = _SPECIMEN.search(description)
+    if not match:
+        return None
+    identifier, number = match.group(1), match.group(2)
+    # The word after the identifier is often the gene ("isolate B12 12S rRNA")
+    if number and _INSTITUTION.match(identifier):
+        number = number.rstrip(".,;:")
+        if _CATALOGUE_NUMBER.match(number) and not _RRNA.match(number) and not find_genes(number):
+            return f"{identifier} {number}"
+    return identifier.rstrip(".,;:")
+
+
+def free_columns(matrix):
+    """Empty columns still carrying their default names, last first (so pop() gives the first)."""
+    free = [col for col in range(matrix.column_count)
+            if _DEFAULT_COLUMN.match(matrix.column_names[col]) and not any(matrix.column_ids(col))]
+    free.reverse()
+    return free
+
+
+def auto_assign(matrix, records):
+    """Assign ``(label, qualifiers)`` pairs to the matrix cells they belong to.
+
+    The label is the "ID description" label of a sequence in the pool;
+    qualifiers may be None or the output of source_qualifiers(). Rows and
+    columns are added as needed; empty ones with default names are reused.
+    """
+    rows = {}
+    for row, name in enumerate(matrix.row_names):
+        rows.setdefault(normalize_specimen(name), row)
+    columns = {}
+    for col, name in enumerate(matrix.column_names):
+        columns.setdefault(normalize_gene(name), col)
+    # Empty rows/columns still carrying their default names are filled first
+    stride = matrix.column_count
+    free_rows = [row for row in range(matrix.row_count)
+                 if _DEFAULT_ROW.match(matrix.row_names[row]) and not any(matrix.grid[row * stride:(row + 1) * stride])]
+    free_rows.reverse()
+    free_cols = free_columns(matrix)
+
+    assigned = 0
+    conflicts = []
+    unassigned = []
+    for label, qualifiers in records:
+        specimen = specimen_of(label, qualifiers)
+        genes = find_genes(label)
+        if not specimen or not normalize_specimen(specimen) or not genes:
+            unassigned.append(label)
+            continue
+        key = normalize_specimen(specimen)
+        row = rows.get(key)
+        if row is None:
+            if free_rows:
+                row = free_rows.pop()
+                matrix.row_names[row] = specimen
+            else:
+                matrix.add_row(specimen)
+                row = matrix.row_count - 1
+            rows[key] = row
+        col = columns.get(genes[0])
+        if col is None:
+            if free_cols:
+                col = free_cols.pop()
+                matrix.column_names[col] = genes[0]
+            else:
+                matrix.add_column(genes[0])
+                col = matrix.column_count - 1
+            columns[genes[0]] = col
+
+        existing = matrix.cell(row, col)
+        if existing and existing != label:
+            conflicts.append(Conflict(matrix.row_names[row], matrix.column_names[col], existing, label))
+            continue
+        matrix.set_cell(row, col, label)
+        assigned += 1
+    return AssignResult(assigned, conflicts, unassigned)
@@ -0,0 +1,201 @@
+"""Persistent SQLite cache of downloaded records.
+
+Records are keyed by accession.version and never expire, since a versioned
+accession always names the same sequence. Lookups by a bare accession go
+through an alias that expires after ``ttl`` seconds, so a newer version is
+picked up eventually. When the stored sequences exceed ``max_bytes`` the
+least recently used records are evicted.
+
+Records downloaded as GenBank also keep their CDS/rRNA/tRNA features (see
+seqmatrix.features), so gene extraction never parses a record twice, and
+the specimen qualifiers of their source feature, which auto-assignment
+prefers to the description.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from seqmatrix.features import dump_features, load_features
+from seqmatrix.ncbi import FetchedRecord
+
+_VERSIONED = re.compile(r"\.\d+$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed_at);
+CREATE TABLE IF NOT EXISTS aliases (
+    accession TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS features (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+def default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "seqmatrix", "accessions.sqlite")
+
+
+def is_versioned(accession):
+    return _VERSIONED.search(accession) is not None
+
+
+class AccessionCache:
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_bytes=1024 ** 3):
+        self.path = path or default_cache_path()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Used from the download thread as well as the GUI thread
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM records").fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _key_for(self, accession, now):
+        accession = accession.strip().upper()
+        if is_versioned(accession):
+            return accession
+        row = self._db.execute("SELECT key, fetched_at FROM aliases WHERE accession = ?",
+                               (accession,)).fetchone()
+        if row is None or row[1] + self.ttl < now:
+            return None
+        return row[0]
+
+    def get(self, accession):
+        """Return the cached FetchedRecord for ``accession``, or None."""
+        now = time.time()
+        with self._lock:
+            key = self._key_for(accession, now)
+            row = None
+            if key is not None:
+                row = self._db.execute("SELECT id, description, sequence FROM records WHERE key = ?",
+                                       (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE records SET accessed_at = ? WHERE key = ?", (now, key))
+        return FetchedRecord(*row)
+
+    def get_features(self, accession):
+        """Return ``(FetchedRecord, features)`` for an accession cached with its features, or None."""
+        now = time.time()
+        with self._lock:
+            key = self._key_for(accession, now)
+            row = None
+            if key is not None:
+                row = self._db.execute("SELECT r.id, r.description, r.sequence, f.data FROM records r "
+                                       "JOIN features f ON f.key = r.key WHERE r.key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE records SET accessed_at = ? WHERE key = ?", (now, key))
+        return FetchedRecord(*row[:3]), load_features(row[3])
+
+    def _put(self, accession, record, now):
+        key = record.id.upper()
+        size = len(record.sequence)
+        old = self._db.execute("SELECT size FROM records WHERE key = ?", (key,)).fetchone()
+        if old is not None:
+            self._total_bytes -= old[0]
+        self._db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, record.id, record.description, record.sequence, size, now, now))
+        self._total_bytes += size
+        accession = accession.strip().upper()
+        if accession != key and not is_versioned(accession):
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)", (accession, key, now))
+        return key
+
+    def put_many(self, items):
+        """Store ``(requested accession, FetchedRecord)`` pairs in one transaction."""
+        now = time.time()
+        with self._lock, self._db:
+            for accession, record in items:
+                self._put(accession, record, now)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def put_features(self, items):
+        """Store ``(requested accession, FetchedRecord, features)`` triples in one transaction."""
+        now = time.time()
+        with self._lock, self._db:
+            for accession, record, features in items:
+                key = self._put(accession, record, now)
+                self._db.execute("INSERT OR REPLACE INTO features VALUES (?, ?)", (key, dump_features(features)))
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def get_sources(self, accessions):
+        """Specimen qualifiers of the cached GenBank records among ``accessions``, by accession."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for accession in accessions:
+                key = self._key_for(accession, now)
+                row = None if key is None else \
+                    self._db.execute("SELECT data FROM sources WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[accession] = json.loads(row[0])
+        return found
+
+    def put_sources(self, items):
+        """Store ``(record id, qualifiers)`` pairs, e.g. from autoassign.source_qualifiers()."""
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?)",
+                                 [(record_id.upper(), json.dumps(qualifiers)) for record_id, qualifiers in items])
+
+    def put(self, accession, record):
+        self.put_many([(accession, record)])
+
+    def _evict(self):
+        # Drop least recently used records until the cache fits again
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM records ORDER BY accessed_at"):
+            if self._total_bytes <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._db.executemany("DELETE FROM records WHERE key = ?", evicted)
+        self._db.executemany("DELETE FROM aliases WHERE key = ?", evicted)
+        self._db.executemany("DELETE FROM features WHERE key = ?", evicted)
+        self._db.executemany("DELETE FROM sources WHERE key = ?", evicted)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,180 @@
+"""Command-line front end: resolve an accession table and export partitions.
+
+    python -m seqmatrix table.tsv -o out/ [--fasta local.fas ...]
+    python -m seqmatrix -o out/ --fasta reads.fas --auto-assign
+    python -m seqmatrix mitogenomes.tsv -o out/ --extract-genes
+    python -m seqmatrix dataset.smproj -o out/ --prepare [--references refs.fas]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from seqmatrix import timing
+from seqmatrix.autoassign import auto_assign, with_qualifiers
+from seqmatrix.cache import AccessionCache
+from seqmatrix.features import FeatureIndex, cell_accessions, extract_genes
+from seqmatrix.matrix import Matrix, read_table
+from seqmatrix.ncbi import EUTILS_URL, NCBIFetcher
+from seqmatrix.prepare import prepare, read_references
+from seqmatrix.project import PROJECT_SUFFIX, ProjectFile, is_project
+from seqmatrix.stats import MatrixStats
+
+
+def log(message):
+    print(message, file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="seqmatrix",
+        description="Resolve a table of accessions/sequence ids and write one FASTA file per partition.")
+    parser.add_argument("table", nargs="?",
+                        help="CSV or TSV file (header of partition names, first column row names) "
+                             f"or a SeqMatrix project ({PROJECT_SUFFIX})")
+    parser.add_argument("-o", "--output", required=True, help="directory for the partition files")
+    parser.add_argument("--concatenate", action="store_true",
+                        help="also write concatenated.nex, concatenated.phy and partitions.txt")
+    parser.add_argument("--fasta", action="append", default=[], metavar="FILE",
+                        help="FASTA file whose records cells may refer to (repeatable)")
+    parser.add_argument("--auto-assign", action="store_true",
+                        help="place the --fasta records into rows/partitions by voucher and gene name")
+    parser.add_argument("--extract-genes", action="store_true",
+                        help="fill the partitions named after genes (or new ones, if none is) with the "
+                             "CDS/rRNA/tRNA features of mitogenomes, plastomes and other multi-gene records")
+    parser.add_argument("--email", default=os.environ.get("NCBI_EMAIL"), help="contact address sent to NCBI")
+    parser.add_argument("--api-key", default=os.environ.get("NCBI_API_KEY"), help="NCBI API key")
+    parser.add_argument("--eutils-url", default=EUTILS_URL, help="E-utilities base URL (default: %(default)s)")
+    parser.add_argument("--no-download", action="store_true", help="do not contact NCBI")
+    parser.add_argument("--cache", metavar="PATH", help="accession cache file (default: user cache directory)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the accession cache")
+    parser.add_argument("--stats", metavar="PATH",
+                        help="write per-partition statistics to PATH and per-cell ones to PATH_cells.tsv")
+    parser.add_argument("--timings", action="store_true",
+                        help="report the time and throughput of each stage (import, fetch, export, ...)")
+    parser.add_argument("--prepare", action="store_true",
+                        help="orient (reverse-complement) and trim each partition's sequences to a reference "
+                             "before exporting; the project and the statistics keep the sequences as they are")
+    parser.add_argument("--references", metavar="FILE",
+                        help="FASTA of --prepare references named after their partitions "
+                             "(default: each partition's sequence of median length)")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="processes used by --prepare (default: one per CPU)")
+    parser.add_argument("--save-project", metavar="PATH",
+                        help=f"save the resolved matrix and its sequences as a project ({PROJECT_SUFFIX})")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.table is None and not args.auto_assign:
+        parser.error("a table is required unless --auto-assign is given")
+    if args.references and not args.prepare:
+        parser.error("--references requires --prepare")
+    if args.extract_genes and args.no_download:
+        parser.error("--extract-genes reads the GenBank records and cannot be used with --no-download")
+    if args.timings:
+        timing.enable()
+    project = None
+    if args.table and is_project(args.table):
+        project = ProjectFile(args.table)
+        matrix = project.load()
+    else:
+        matrix = read_table(args.table) if args.table else Matrix(0, 0)
+    imported = []
+    for path in args.fasta:
+        labels = matrix.load_fasta(path)
+        imported.extend(labels)
+        log(f"[LOG] Imported {len(labels)} sequences from {path}")
+
+    # Read even without downloading: it holds the source qualifiers of records parsed from GenBank
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = AccessionCache(args.cache)
+        except (OSError, sqlite3.Error) as e:
+            log(f"[ERROR] Cannot open the accession cache, running without it: {e}")
+    fetcher = None
+    if not args.no_download:
+        fetcher = NCBIFetcher(email=args.email, api_key=args.api_key, base_url=args.eutils_url, cache=cache)
+    try:
+        if args.auto_assign:
+            result = auto_assign(matrix, with_qualifiers(imported, cache))
+            log(f"[LOG] Auto-assigned {result.assigned} sequences, "
+                f"{len(result.unassigned)} without voucher or gene name")
+            for conflict in result.conflicts:
+                log(f"[CONFLICT] {conflict.row} / {conflict.column}: kept {conflict.existing}, "
+                    f"skipped {conflict.label}")
+        failures = matrix.resolve(fetcher)
+        feature_failures = {}
+        if args.extract_genes:
+            records, feature_failures = fetcher.fetch_features(cell_accessions(matrix))
+            for accession, error in feature_failures.items():
+                log(f"[ERROR] Failed to get the features of {accession}: {error}")
+            index = FeatureIndex()
+            for record, features in records.values():
+                index.add(record.id, features)
+            result = extract_genes(matrix, index)
+            log(f"[LOG] Extracted {result.filled} genes from {len(index)} records "
+                f"({result.columns_added} partitions added, {result.missing} genes missing from their records)")
+            for conflict in result.conflicts:
+                log(f"[CONFLICT] {conflict.row} / {conflict.column}: kept {conflict.existing}, skipped {conflict.label}")
+    finally:
+        if cache is not None:
+            cache.close()
+    for collision in matrix.sequences.take_collisions():
+        log(f"[CONFLICT] {collision.label}: {collision.old_length}bp sequence replaced "
+            f"by a different {collision.new_length}bp one")
+    memory = matrix.sequences.stats()
+    log(f"[LOG] {memory.labels} sequences, {memory.unique} distinct in memory "
+        f"({memory.stored_bytes / 1e6:.1f} MB for {memory.logical_bytes / 1e6:.1f} MB of sequence)")
+    unresolved = matrix.unresolved()
+    stats = MatrixStats(matrix)
+    stats.update()
+    for outlier in stats.outliers():
+        log(f"[OUTLIER] {outlier.row} / {outlier.column}: {outlier.length}bp, "
+            f"partition median {outlier.median_length:g}bp ({outlier.label})")
+    if args.stats:
+        stats.write_tsv(args.stats)
+        stats.write_cells_tsv(os.path.splitext(args.stats)[0] + "_cells.tsv")
+    for text in sorted(unresolved):
+        log(f"[ERROR] Unresolved cell: {text}" + (f" ({failures[text]})" if text in failures else ""))
+    # Range members and query pages fail without leaving a cell unresolved
+    for key in sorted(set(failures) - set(unresolved)):
+        log(f"[ERROR] Failed to download {key}: {failures[key]}")
+
+    projects = [project] if project is not None else []
+    try:
+        if args.save_project:
+            if project is not None and os.path.abspath(args.save_project) == os.path.abspath(args.table):
+                target = project
+            else:
+                # Saved sequences are read back from the new project while exporting
+                target = ProjectFile(args.save_project)
+                projects.append(target)
+            written = target.save(matrix)
+            log(f"[LOG] Saved project {args.save_project} ({written} sequences written)")
+        exported = matrix
+        if args.prepare:
+            references = read_references(args.references) if args.references else {}
+            for name in sorted(set(references) - set(matrix.column_names)):
+                log(f"[ERROR] Reference {name} does not name a partition")
+            exported, reports = prepare(matrix, references, workers=args.workers)
+            for report in reports:
+                if report.sequences:
+                    log(f"[LOG] {report.name}: {report.reversed} reverse-complemented, {report.trimmed} trimmed, "
+                        f"{report.unmatched} not matching the reference")
+        os.makedirs(args.output, exist_ok=True)
+        for path in exported.export_partitions(args.output):
+            log(f"[LOG] Exported partition file: {path}")
+        if args.concatenate:
+            for path in exported.export_supermatrix(args.output):
+                log(f"[LOG] Exported supermatrix file: {path}")
+    finally:
+        for opened in projects:
+            opened.close()
+    if timing.enabled():
+        for line in timing.report():
+            log(f"[TIME] {line}")
+    return 1 if unresolved or failures or feature_failures else 0
@@ -0,0 +1,188 @@
+"""Writers for partition FASTA files and the concatenated supermatrix.
+
+Rows are streamed to disk piece by piece; no row is ever assembled into one
+string. Partition files are written in parallel, one task per partition.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from seqmatrix import timing
+
+_PLAIN_NAME = re.compile(r"^[A-Za-z0-9_.\-]+$")
+
+
+def nexus_name(name):
+    if _PLAIN_NAME.match(name):
+        return name
+    return "'" + name.replace("'", "''") + "'"
+
+
+def phylip_name(name):
+    return re.sub(r"[\s(),:;'\[\]]+", "_", name.strip())
+
+
+def unique_names(names):
+    """The names with repeats made distinct (COI, COI_2, ...), case-insensitively, as files need."""
+    taken = {name.casefold() for name in names}
+    seen = set()
+    unique = []
+    for name in names:
+        if name.casefold() in seen:
+            number = 2
+            while f"{name}_{number}".casefold() in taken:
+                number += 1
+            name = f"{name}_{number}"
+            taken.add(name.casefold())
+        seen.add(name.casefold())
+        unique.append(name)
+    return unique
+
+
+def column_rows(matrix, col):
+    """(row name, sequence) for every cell of a column that holds a sequence."""
+    labels, sequences = matrix.labels, matrix.sequences
+    for row_name, label_id in zip(matrix.row_names, matrix.column_ids(col)):
+        if label_id:
+            sequence = sequences.get(labels[label_id])
+            if sequence:
+                yield row_name, sequence
+
+
+def write_partition(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row_name, sequence in rows:
+            f.write(">")
+            f.write(row_name)
+            f.write("\n")
+            f.write(sequence)
+            f.write("\n")
+
+
+def _export_column(matrix, col, name, directory):
+    labels, sequences = matrix.labels, matrix.sequences
+    if not any(label_id and labels[label_id] in sequences for label_id in matrix.column_ids(col)):
+        return None
+    path = os.path.join(directory, f"{name}.fas")
+    write_partition(path, column_rows(matrix, col))
+    return path
+
+
+def export_partitions(matrix, directory, workers=None):
+    """Write one FASTA file per non-empty partition; returns the written paths.
+
+    Partitions sharing a name get files of their own, see unique_names().
+    """
+    if not matrix.column_count:
+        return []
+    workers = workers or min(32, matrix.column_count)
+    # Two tasks must never write the same file
+    names = unique_names(matrix.column_names)
+    with timing.stage("export") as stage, ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = pool.map(lambda col: _export_column(matrix, col, names[col], directory), range(matrix.column_count))
+        paths = [path for path in paths if path]
+        if timing.enabled():
+            stage.add(records=len(paths), bytes=sum(os.path.getsize(path) for path in paths))
+        return paths
+
+
+def supermatrix_layout(matrix):
+    """Length of each partition (its longest sequence) and the rows holding any sequence."""
+    lengths = [0] * matrix.column_count
+    rows = []
+    labels, sequences = matrix.labels, matrix.sequences
+    columns = matrix.column_count
+    for row in range(matrix.row_count):
+        has_sequence = False
+        for col, label_id in enumerate(matrix.grid[row * columns:(row + 1) * columns]):
+            if label_id:
+                sequence = sequences.get(labels[label_id])
+                if sequence:
+                    has_sequence = True
+                    if len(sequence) > lengths[col]:
+                        lengths[col] = len(sequence)
+        if has_sequence:
+            rows.append(row)
+    return lengths, rows
+
+
+def charsets(matrix, lengths):
+    """(partition name, first site, last site) for every non-empty partition."""
+    start = 1
+    for name, length in zip(unique_names(matrix.column_names), lengths):
+        if length:
+            yield name, start, start + length - 1
+            start += length
+
+
+def write_supermatrix(matrix, nexus_path=None, phylip_path=None, partition_path=None):
+    """Concatenate all partitions into NEXUS and/or relaxed PHYLIP files.
+
+    Missing loci are filled with '?' and sequences shorter than their
+    partition are padded with '-'. ``partition_path`` receives a RAxML-style
+    partition file, which IQ-TREE reads as well.
+    """
+    with timing.stage("supermatrix") as stage:
+        _write_supermatrix(matrix, nexus_path, phylip_path, partition_path)
+        if timing.enabled():
+            stage.add(records=matrix.row_count,
+                      bytes=sum(os.path.getsize(path) for path in (nexus_path, phylip_path) if path))
+
+
+def _write_supermatrix(matrix, nexus_path, phylip_path, partition_path):
+    lengths, rows = supermatrix_layout(matrix)
+    total = sum(lengths)
+    columns = [col for col, length in enumerate(lengths) if length]
+    missing = {col: "?" * lengths[col] for col in columns}
+    labels, sequences = matrix.labels, matrix.sequences
+
+    handles = []
+    try:
+        if nexus_path:
+            nexus = open(nexus_path, "w", encoding="utf-8")
+            handles.append(nexus)
+            nexus.write("#NEXUS\nBEGIN DATA;\n")
+            nexus.write(f"DIMENSIONS NTAX={len(rows)} NCHAR={total};\n")
+            nexus.write("FORMAT DATATYPE=DNA MISSING=? GAP=-;\nMATRIX\n")
+        if phylip_path:
+            phylip = open(phylip_path, "w", encoding="utf-8")
+            handles.append(phylip)
+            phylip.write(f"{len(rows)} {total}\n")
+        names = {}
+        if nexus_path:
+            names[nexus] = [nexus_name(name) for name in matrix.row_names]
+        if phylip_path:
+            names[phylip] = [phylip_name(name) for name in matrix.row_names]
+        width = max((len(names[f][row]) for f in handles for row in rows), default=0) + 1
+
+        for row in rows:
+            for f in handles:
+                f.write(names[f][row].ljust(width))
+            row_ids = matrix.grid[row * matrix.column_count:(row + 1) * matrix.column_count]
+            for col in columns:
+                sequence = sequences.get(labels[row_ids[col]]) if row_ids[col] else None
+                if not sequence:
+                    pieces = (missing[col],)
+                elif len(sequence) < lengths[col]:
+                    pieces = (sequence, "-" * (lengths[col] - len(sequence)))
+                else:
+                    pieces = (sequence,)
+                for f in handles:
+                    for piece in pieces:
+                        f.write(piece)
+            for f in handles:
+                f.write("\n")
+
+        if nexus_path:
+            nexus.write(";\nEND;\n\nBEGIN SETS;\n")
+            for name, start, end in charsets(matrix, lengths):
+                nexus.write(f"CHARSET {nexus_name(name)} = {start}-{end};\n")
+            nexus.write("END;\n")
+    finally:
+        for f in handles:
+            f.close()
+
+    if partition_path:
+        with open(partition_path, "w", encoding="utf-8") as f:
+            for name, start, end in charsets(matrix, lengths):
+                f.write(f"DNA, {phylip_name(name)} = {start}-{end}\n")
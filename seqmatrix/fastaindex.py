@@ -0,0 +1,101 @@
+"""Offset index of a FASTA file, read through mmap.
+
+Building the index only scans for header lines, so it runs at close to disk
+speed and keeps nothing but label -> (offset, length) in memory. Sequences
+are read back from the mapped file when they are actually needed.
+"""
+import hashlib
+import mmap
+import os
+import threading
+
+from seqmatrix import timing
+
+# Progress is reported about this often while scanning
+_PROGRESS_STEP = 4 * 1024 * 1024
+
+
+def header_label(header):
+    # "ID description", the label SeqMatrix shows for every sequence
+    return " ".join(header.strip().split(None, 1))
+
+
+class FastaIndex:
+    def __init__(self, path):
+        self.path = path
+        # label -> (offset of the sequence lines, their length in bytes)
+        self.records = {}
+        # (size, mtime) of the file when it was indexed
+        self.signature = None
+        self._digests = {}
+        self._map = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, path, progress=None):
+        """Index ``path``; ``progress(done_bytes, total_bytes)`` is called while scanning."""
+        with timing.stage("import") as stage:
+            index = cls._build(path, progress)
+            stage.add(records=len(index), bytes=os.path.getsize(path))
+        return index
+
+    @classmethod
+    def _build(cls, path, progress):
+        index = cls(path)
+        stat = os.stat(path)
+        size = stat.st_size
+        index.signature = (size, stat.st_mtime_ns)
+        if size == 0:
+            return index
+        records = index.records
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            next_report = _PROGRESS_STEP
+            if mm[:1] == b">":
+                pos = 0
+            else:
+                # Skip anything before the first header
+                pos = mm.find(b"\n>")
+                if pos != -1:
+                    pos += 1
+            while pos != -1:
+                eol = mm.find(b"\n", pos)
+                if eol == -1:
+                    eol = size
+                label = header_label(mm[pos + 1:eol].decode("utf-8", "replace"))
+                following = mm.find(b"\n>", eol)
+                end = size if following == -1 else following + 1
+                records[label] = (eol + 1, end - eol - 1)
+                pos = -1 if following == -1 else following + 1
+                if progress is not None and end >= next_report:
+                    progress(end, size)
+                    next_report = end + _PROGRESS_STEP
+        if progress is not None:
+            progress(size, size)
+        return index
+
+    def __len__(self):
+        return len(self.records)
+
+    def sequence(self, label):
+        offset, length = self.records[label]
+        if length <= 0:
+            return ""
+        if self._map is None:
+            # Partitions may be exported from several threads at once
+            with self._lock:
+                if self._map is None:
+                    with open(self.path, "rb") as f:
+                        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length].translate(None, b"\r\n \t").decode("ascii", "replace")
+
+    def digest(self, label):
+        """SHA-1 of a record's sequence, as SequenceStore hashes it."""
+        digest = self._digests.get(label)
+        if digest is None:
+            digest = self._digests[label] = hashlib.sha1(self.sequence(label).encode("ascii", "replace")).digest()
+        return digest
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
@@ -0,0 +1,192 @@
+"""Gene features of GenBank records, and filling partitions with them.
+
+A mitogenome or plastome resolved into one cell holds every marker at once.
+Its CDS, rRNA and tRNA features are reduced to (gene, type, parts) tuples
+when the GenBank record is parsed, and kept in the accession cache next to
+the sequence, so each record is parsed once. Gene names are normalized
+(COI, CO1 and cox1 are all COX1). FeatureIndex maps every gene name to the
+records carrying it, and extract_genes() fills the partition named after
+each gene with slices of the cached sequences.
+"""
+import json
+import re
+from collections import namedtuple
+
+from seqmatrix.autoassign import Conflict, free_columns
+from seqmatrix.accessions import is_accession
+from seqmatrix.genes import find_genes, normalize_gene
+from seqmatrix.nucleotides import reverse_complement
+
+FEATURE_TYPES = ("CDS", "rRNA", "tRNA")
+# Records naming fewer genes are single markers, e.g. a COI barcode, and are left as they are
+MIN_GENES = 2
+# Descriptions of whole or partial organelle genomes, e.g. "mitochondrion, complete genome"
+_GENOME = re.compile(r"\bgenome\b", re.IGNORECASE)
+# tRNA genes as descriptions name them, e.g. "tRNA-Leu (trnL) gene"
+_TRNA = re.compile(r"\btRNA-[A-Z][a-z]{2}\b")
+
+# parts are (start, end, strand) in the order they are joined
+Feature = namedtuple("Feature", ["gene", "type", "parts"])
+ExtractResult = namedtuple("ExtractResult", ["filled", "columns_added", "conflicts", "missing"])
+
+def feature_gene(feature):
+    """Canonical gene name of a Bio.SeqFeature, from its gene or else its product qualifier."""
+    genes = feature.qualifiers.get("gene")
+    if genes:
+        return normalize_gene(genes[0])
+    products = feature.qualifiers.get("product")
+    if products:
+        found = find_genes(products[0])
+        return found[0] if found else normalize_gene(products[0])
+    return None
+
+
+def record_features(record):
+    """The CDS, rRNA and tRNA Features of a Bio.SeqRecord parsed from GenBank."""
+    features = []
+    for feature in record.features:
+        if feature.type not in FEATURE_TYPES or feature.location is None:
+            continue
+        gene = feature_gene(feature)
+        parts = feature.location.parts
+        # Parts lying in other records cannot be cut from this one
+        if gene is None or any(part.ref for part in parts):
+            continue
+        features.append(Feature(gene, feature.type,
+                                tuple((int(part.start), int(part.end), part.strand or 1) for part in parts)))
+    return features
+
+
+def dump_features(features):
+    return json.dumps([[feature.gene, feature.type, feature.parts] for feature in features], separators=(",", ":"))
+
+
+def load_features(text):
+    return [Feature(gene, type_, tuple(map(tuple, parts))) for gene, type_, parts in json.loads(text)]
+
+
+def extract(sequence, parts):
+    """The sequence of a feature with these parts, reverse-complemented where on the minus strand."""
+    pieces = []
+    for start, end, strand in parts:
+        piece = sequence[start:end]
+        pieces.append(reverse_complement(piece) if strand == -1 else piece)
+    return "".join(pieces)
+
+
+class FeatureIndex:
+    def __init__(self):
+        # record id -> {gene: first feature naming it}
+        self.records = {}
+        # gene -> number of records carrying it, in order of first appearance
+        self.genes = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, record_id):
+        return record_id in self.records
+
+    def add(self, record_id, features):
+        genes = {}
+        for feature in features:
+            genes.setdefault(feature.gene, feature)
+        self.records[record_id] = genes
+        for gene in genes:
+            self.genes[gene] = self.genes.get(gene, 0) + 1
+
+    def feature(self, record_id, gene):
+        return self.records.get(record_id, {}).get(gene)
+
+
+def is_multigene(description):
+    """True for a record description that names a genome or at least MIN_GENES genes."""
+    if _GENOME.search(description):
+        return True
+    return len(find_genes(description)) + len(set(_TRNA.findall(description))) >= MIN_GENES
+
+
+def cell_accessions(matrix):
+    """Record ids of the pooled sequences in the matrix worth reading the features of.
+
+    Only accessions whose description marks a multi-gene record are
+    returned: reading the GenBank entry of every barcode in a large matrix
+    would cost a download per cell, only for it to be left alone.
+    """
+    labels, sequences = matrix.labels, matrix.sequences
+    ids = []
+    for label_id in sorted(set(matrix.grid)):
+        label = labels[label_id]
+        if label_id and label in sequences:
+            record_id, _, description = label.partition(" ")
+            if is_accession(record_id) and is_multigene(description):
+                ids.append(record_id)
+    return ids
+
+
+def extract_genes(matrix, index, add_columns=False):
+    """Fill the partitions named after genes with the genes of the multi-gene records in each row.
+
+    A record is used when it carries at least MIN_GENES genes. Cells that
+    are empty or hold such a record get the gene cut from the first of the
+    row's records carrying it; cells holding anything else are reported as
+    conflicts and left alone. With ``add_columns``, or when no partition is
+    named after a gene yet, a partition is given to every gene missing one;
+    empty partitions with default names are reused first.
+    """
+    columns = {}
+    for col, name in enumerate(matrix.column_names):
+        columns.setdefault(normalize_gene(name), col)
+    added = 0
+    if add_columns or not any(gene in columns for gene in index.genes):
+        new = [gene for gene in index.genes if gene not in columns]
+        free = free_columns(matrix)
+        first = matrix.column_count
+        matrix.resize(columns=first + max(len(new) - len(free), 0))
+        for gene in new:
+            col = free.pop() if free else first + added
+            if col >= first:
+                added += 1
+            matrix.column_names[col] = gene
+            columns[gene] = col
+    wanted = [(gene, columns[gene]) for gene in index.genes if gene in columns]
+
+    labels, sequences = matrix.labels, matrix.sequences
+    stride = matrix.column_count
+    filled = 0
+    missing = 0
+    conflicts = []
+    for row in range(matrix.row_count):
+        row_ids = matrix.grid[row * stride:(row + 1) * stride]
+        sources = []
+        source_ids = set()
+        for label_id in row_ids:
+            if not label_id or label_id in source_ids:
+                continue
+            record_id = labels[label_id].split(" ", 1)[0]
+            if len(index.records.get(record_id, ())) >= MIN_GENES and labels[label_id] in sequences:
+                sources.append((record_id, labels[label_id]))
+                source_ids.add(label_id)
+        if not sources:
+            continue
+        genomes = {}
+        for gene, col in wanted:
+            for record_id, source in sources:
+                feature = index.feature(record_id, gene)
+                if feature is not None:
+                    break
+            else:
+                missing += 1
+                continue
+            label = f"{record_id}:{gene} {feature.type}"
+            current = row_ids[col]
+            if current and current not in source_ids and labels[current] != label:
+                conflicts.append(Conflict(matrix.row_names[row], matrix.column_names[col], labels[current], label))
+                continue
+            if label not in sequences:
+                if source not in genomes:
+                    genomes[source] = sequences[source]
+                sequences[label] = extract(genomes[source], feature.parts)
+            matrix.set_cell(row, col, label)
+            filled += 1
+    return ExtractResult(filled, added, conflicts, missing)
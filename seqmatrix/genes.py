@@ -0,0 +1,88 @@
+"""Gene name normalization for the common phylogenetic markers.
+
+normalize_gene() maps the many spellings of a marker (COI, CO1, cox1,
+"cytochrome c oxidase subunit I", ...) to one canonical name, and
+find_genes() picks those names out of free text such as a GenBank
+DEFINITION line.
+"""
+import re
+
+_ROMAN = {"1": "I", "2": "II", "3": "III"}
+
+GENE_SYNONYMS = {
+    "COX1": ["COI", "CO1", "COXI", "cytochrome c oxidase subunit I", "cytochrome oxidase subunit I"],
+    "COX2": ["COII", "CO2", "COXII", "cytochrome c oxidase subunit II", "cytochrome oxidase subunit II"],
+    "COX3": ["COIII", "CO3", "COXIII", "cytochrome c oxidase subunit III", "cytochrome oxidase subunit III"],
+    "CYTB": ["cob", "cyt b", "cytochrome b"],
+    "ATP6": ["atpase6", "ATP synthase F0 subunit 6", "ATP synthase subunit 6"],
+    "ATP8": ["atpase8", "ATP synthase F0 subunit 8", "ATP synthase subunit 8"],
+    "ND1": ["nad1", "NADH dehydrogenase subunit 1"],
+    "ND2": ["nad2", "NADH dehydrogenase subunit 2"],
+    "ND3": ["nad3", "NADH dehydrogenase subunit 3"],
+    "ND4": ["nad4", "NADH dehydrogenase subunit 4"],
+    "ND4L": ["nad4l", "NADH dehydrogenase subunit 4L"],
+    "ND5": ["nad5", "NADH dehydrogenase subunit 5"],
+    "ND6": ["nad6", "NADH dehydrogenase subunit 6"],
+    "12S": ["rrnS", "s-rRNA", "12S rRNA", "12S ribosomal RNA", "small subunit ribosomal RNA mitochondrial"],
+    "16S": ["rrnL", "l-rRNA", "16S rRNA", "16S ribosomal RNA"],
+    "18S": ["SSU", "18S rRNA", "18S ribosomal RNA", "small subunit ribosomal RNA"],
+    "28S": ["LSU", "28S rRNA", "28S ribosomal RNA", "large subunit ribosomal RNA"],
+    "ITS": ["internal transcribed spacer", "ITS1", "ITS2", "5.8S ribosomal RNA"],
+    "RBCL": ["ribulose-1,5-bisphosphate carboxylase/oxygenase large subunit", "ribulose bisphosphate carboxylase large chain"],
+    "MATK": ["maturase K"],
+    "TEF1": ["EF1A", "EF-1a", "tef1-alpha", "translation elongation factor 1-alpha", "elongation factor 1 alpha"],
+    "RPB1": ["RNA polymerase II largest subunit"],
+    "RPB2": ["RNA polymerase II second largest subunit"],
+    "TUB2": ["BT", "beta-tubulin", "tubulin beta"],
+    "H3": ["histone H3"],
+}
+
+
+def gene_key(name):
+    # Case, spacing and punctuation do not distinguish gene names
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def _build_tables():
+    canonical = {}
+    # first word -> (words, gene) for every spelling, longest first
+    phrases = {}
+    for gene, synonyms in GENE_SYNONYMS.items():
+        for name in [gene] + synonyms:
+            # "subunit 1" is as common as "subunit I"
+            variants = {name, re.sub(r"subunit (I+)$", lambda m: "subunit " + str(len(m.group(1))), name)}
+            for variant in variants:
+                canonical.setdefault(gene_key(variant), gene)
+                words = tuple(_TOKEN.findall(variant.lower()))
+                phrases.setdefault(words[0], []).append((words, gene))
+    for candidates in phrases.values():
+        candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+    return canonical, phrases
+
+
+_CANONICAL, _PHRASES = _build_tables()
+
+
+def normalize_gene(name):
+    """Canonical name of a marker, or the name upper-cased if it is not a known synonym."""
+    return _CANONICAL.get(gene_key(name), name.strip().upper())
+
+
+def find_genes(text):
+    """Canonical names of the markers mentioned in ``text``, in order of appearance."""
+    # Matching whole words through a first-word dict keeps this linear in the text
+    words = _TOKEN.findall(text.lower())
+    genes = []
+    i = 0
+    while i < len(words):
+        for phrase, gene in _PHRASES.get(words[i], ()):
+            if tuple(words[i:i + len(phrase)]) == phrase:
+                if gene not in genes:
+                    genes.append(gene)
+                i += len(phrase) - 1
+                break
+        i += 1
+    return genes
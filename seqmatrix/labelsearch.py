@@ -0,0 +1,82 @@
+"""Case-insensitive substring and regex search over sequence labels.
+
+Labels are added in batches. Each batch is kept as one lowercased,
+newline-joined string with the offset of every label, so a substring query
+is a handful of str.find calls plus a bisect per hit instead of a Python
+loop over every label. When a query only extends the previous one and that
+already narrowed the list down, just the previous hits are re-checked.
+"""
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class LabelSearch:
+    def __init__(self):
+        self.labels = []
+        # (index of the first label, joined lowercase labels, label offsets)
+        self._chunks = []
+        self._firsts = []
+        self._last_query = None
+        self._last_hits = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def extend(self, labels):
+        labels = list(labels)
+        if not labels:
+            return
+        first = len(self.labels)
+        lowered = [label.lower() for label in labels]
+        offsets = array("q", accumulate((len(label) + 1 for label in lowered), initial=0))
+        self.labels.extend(labels)
+        self._chunks.append((first, "\n".join(lowered) + "\n", offsets))
+        self._firsts.append(first)
+        if self._last_hits is not None:
+            self._last_hits.extend(self._find(self._last_query, [self._chunks[-1]]))
+
+    def _lowered(self, index):
+        first, haystack, offsets = self._chunks[bisect_right(self._firsts, index) - 1]
+        i = index - first
+        return haystack[offsets[i]:offsets[i + 1] - 1]
+
+    def _find(self, needle, chunks):
+        hits = []
+        for first, haystack, offsets in chunks:
+            count = len(offsets) - 1
+            if haystack.count(needle) * 8 > count:
+                # Common needle: testing every label beats jumping from hit to hit
+                lowered = haystack.split("\n")
+                hits.extend(first + i for i in range(count) if needle in lowered[i])
+                continue
+            pos = haystack.find(needle)
+            while pos != -1:
+                i = bisect_right(offsets, pos) - 1
+                hits.append(first + i)
+                # Continue from the next label so each label is reported once
+                pos = haystack.find(needle, offsets[i + 1])
+        return hits
+
+    def search(self, query, regex=False):
+        """Indices of the labels matching ``query``, or None when it is empty.
+
+        Raises re.error for an invalid regular expression.
+        """
+        if not query:
+            self._last_query = self._last_hits = None
+            return None
+        if regex:
+            self._last_query = self._last_hits = None
+            pattern = re.compile(query, re.IGNORECASE)
+            return [i for i, label in enumerate(self.labels) if pattern.search(label)]
+
+        needle = query.lower()
+        narrowing = self._last_hits is not None and self._last_query in needle
+        if narrowing and len(self._last_hits) * 8 <= len(self.labels):
+            hits = [i for i in self._last_hits if needle in self._lowered(i)]
+        else:
+            hits = self._find(needle, self._chunks)
+        self._last_query, self._last_hits = needle, hits
+        return list(hits)
@@ -0,0 +1,294 @@
+"""The dataset behind the SeqMatrix table, without any GUI.
+
+Each column is a partition and each row an isolate or voucher. A cell holds
+the label of a sequence in ``Matrix.sequences`` (an "ID description" string
+as shown in the sequence list) or an accession that has not been resolved
+yet.
+"""
+import csv
+import os
+from array import array
+
+from seqmatrix import export, timing
+from seqmatrix.accessions import classify, is_accession, is_query, is_range
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.store import SequenceStore
+
+
+class Matrix:
+    """Grid of cell labels stored as one flat array of label ids.
+
+    Every distinct cell text is interned once in ``labels``; the grid keeps
+    only its index (0 is the empty cell), row-major, so whole-matrix and
+    per-column operations run over an ``array`` instead of Python objects.
+    """
+
+    def __init__(self, rows=5, columns=3):
+        self.row_names = [f"Sequence_{i+1}" for i in range(rows)]
+        self.column_names = [f"Partition_{i+1}" for i in range(columns)]
+        self.labels = [""]
+        self._label_ids = {"": 0}
+        self.grid = array("i", [0]) * (rows * columns)
+        self.sequences = SequenceStore()
+
+    @classmethod
+    def from_grid(cls, row_names, column_names, labels, grid):
+        """A matrix over an existing label pool and row-major grid of label ids."""
+        matrix = cls(0, 0)
+        matrix.row_names = list(row_names)
+        matrix.column_names = list(column_names)
+        matrix.labels = list(labels)
+        matrix._label_ids = {}
+        for label_id, text in enumerate(matrix.labels):
+            matrix._label_ids.setdefault(text, label_id)
+        matrix.grid = grid
+        return matrix
+
+    @property
+    def row_count(self):
+        return len(self.row_names)
+
+    @property
+    def column_count(self):
+        return len(self.column_names)
+
+    def add_row(self, name=None):
+        self.row_names.append(name or f"Sequence_{self.row_count + 1}")
+        self.grid.extend(array("i", [0]) * self.column_count)
+
+    def add_column(self, name=None):
+        self.resize(columns=self.column_count + 1)
+        if name:
+            self.column_names[-1] = name
+
+    def resize(self, rows=0, columns=0):
+        """Grow the matrix to at least ``rows`` x ``columns`` in one step.
+
+        New rows and columns get default names; the matrix never shrinks.
+        """
+        old_rows, old_columns = self.row_count, self.column_count
+        if columns > old_columns:
+            self.column_names.extend(f"Partition_{i + 1}" for i in range(old_columns, columns))
+            grid = array("i", [0]) * (old_rows * columns)
+            if old_columns:
+                for row in range(old_rows):
+                    grid[row * columns:row * columns + old_columns] = \
+                        self.grid[row * old_columns:(row + 1) * old_columns]
+            self.grid = grid
+        if rows > old_rows:
+            self.row_names.extend(f"Sequence_{i + 1}" for i in range(old_rows, rows))
+            self.grid.extend(array("i", [0]) * ((rows - old_rows) * self.column_count))
+
+    def intern(self, text):
+        label_id = self._label_ids.get(text)
+        if label_id is None:
+            label_id = self._label_ids[text] = len(self.labels)
+            self.labels.append(text)
+        return label_id
+
+    def cell(self, row, col):
+        return self.labels[self.grid[row * self.column_count + col]]
+
+    def set_cell(self, row, col, text):
+        self.grid[row * self.column_count + col] = self.intern(text.strip())
+
+    def write_block(self, row, col, block):
+        """Write rows of cell texts with the first one at (row, col), growing the matrix as needed."""
+        with timing.stage("paste") as stage:
+            self.resize(row + len(block), col + max(map(len, block), default=0))
+            columns, grid, intern = self.column_count, self.grid, self.intern
+            for i, texts in enumerate(block):
+                start = (row + i) * columns + col
+                grid[start:start + len(texts)] = array("i", [intern(text.strip()) for text in texts])
+                stage.add(records=len(texts))
+
+    def split_cells(self):
+        """Spread every cell holding several lines over the cells below it, one line each.
+
+        Cells are taken top to bottom, so a line spilling into a cell
+        replaces its text. Returns the number of cells that were split.
+        """
+        with timing.stage("format") as stage:
+            multiline = {label_id for label_id, text in enumerate(self.labels) if "\n" in text}
+            if not multiline:
+                return 0
+            columns = self.column_count
+            # Row-major order is top to bottom within every column
+            covered = [0] * columns
+            spills = []
+            for index, label_id in enumerate(self.grid):
+                if label_id in multiline:
+                    row, col = divmod(index, columns)
+                    if row >= covered[col]:
+                        lines = self.labels[label_id].split("\n")
+                        spills.append((row, col, lines))
+                        covered[col] = row + len(lines)
+            self.resize(rows=max(row + len(lines) for row, _, lines in spills))
+            grid, intern = self.grid, self.intern
+            for row, col, lines in spills:
+                # The lines go down one column: a strided slice of the grid
+                start = row * columns + col
+                grid[start:start + len(lines) * columns:columns] = array("i", [intern(line.strip()) for line in lines])
+                stage.add(records=len(lines))
+            return len(spills)
+
+    def column_ids(self, col):
+        return self.grid[col::self.column_count] if self.column_count else array("i")
+
+    def sequence(self, row, col):
+        return self.sequences.get(self.cell(row, col))
+
+    def relabel(self, old, new):
+        """Change the text of every cell reading ``old`` to ``new``."""
+        old_id = self._label_ids.get(old)
+        if not old_id or old == new:
+            return
+        del self._label_ids[old]
+        new_id = self._label_ids.get(new)
+        if new_id is None:
+            # Renaming the pooled label updates all of its cells at once
+            self.labels[old_id] = new
+            self._label_ids[new] = old_id
+            return
+        grid = self.grid
+        for index, label_id in enumerate(grid):
+            if label_id == old_id:
+                grid[index] = new_id
+
+    def expand(self, text, labels):
+        """Spread the records a range or query cell stands for down its column.
+
+        The first of ``labels`` replaces ``text``; each further one goes into
+        the row named after its record id. That is an existing row when its
+        cell in this column is empty (or already holds the record, as with
+        overlapping ranges), otherwise a new row, given a name of its own
+        (MN100001_2, ...) when the id is taken. Returns the number of rows added.
+        """
+        label_id = self._label_ids.get(text)
+        if not label_id or not labels:
+            return 0
+        columns = self.column_count
+        col = self.grid.index(label_id) % columns
+        self.relabel(text, labels[0])
+        rows = {}
+        for row, name in enumerate(self.row_names):
+            rows.setdefault(name, []).append(row)
+        added = 0
+        for label in labels[1:]:
+            new_id = self.intern(label)
+            name = label.split(" ", 1)[0]
+            cells = [(row, self.grid[row * columns + col]) for row in rows.get(name, ())]
+            if any(cell == new_id for _, cell in cells):
+                continue
+            free = [row for row, cell in cells if not cell]
+            if free:
+                self.grid[free[0] * columns + col] = new_id
+                continue
+            if name in rows:
+                number = 2
+                while f"{name}_{number}" in rows:
+                    number += 1
+                name = f"{name}_{number}"
+            self.add_row(name)
+            rows[name] = [self.row_count - 1]
+            self.grid[(self.row_count - 1) * columns + col] = new_id
+            added += 1
+        return added
+
+    def load_fasta(self, path, progress=None):
+        """Index a FASTA file and add its records to the sequence pool; returns their labels."""
+        index = FastaIndex.build(path, progress)
+        self.sequences.add_index(index)
+        return list(index.records)
+
+    def unresolved(self):
+        """Distinct cell texts that do not name a sequence in the pool."""
+        return [self.labels[label_id] for label_id in sorted(set(self.grid))
+                if label_id and self.labels[label_id] not in self.sequences]
+
+    def is_malformed(self, text):
+        """True for cell text that is not a pooled sequence, an accession, a range or a query."""
+        return bool(text) and text not in self.sequences and not _fetchable(text)
+
+    def malformed(self):
+        """Distinct cell texts that cannot be resolved as they are written."""
+        return [text for text in self.unresolved() if not _fetchable(text)]
+
+    def fetchable(self):
+        """Distinct unresolved cell texts that can be downloaded: accessions, ranges and queries."""
+        return [text for text in self.unresolved() if _fetchable(text)]
+
+    def resolve(self, fetcher=None, callback=None):
+        """Point every cell at a sequence in the pool.
+
+        Cells naming a loaded record by its bare id are relabelled; anything
+        else is downloaded with ``fetcher`` (an NCBIFetcher) when one is given.
+        Ranges and Entrez queries are spread over new rows with expand() once
+        all of their records have arrived (see NCBIFetcher.fetch_cells).
+        Returns the failures reported by the fetcher.
+        """
+        by_id = {label.split(" ", 1)[0]: label for label in self.sequences}
+        pending = []
+        for text in self.unresolved():
+            label = by_id.get(text)
+            if label is not None:
+                self.relabel(text, label)
+            elif _fetchable(text):
+                pending.append(text)
+        if fetcher is None:
+            return classify(pending).failures
+
+        plain = set(pending)
+
+        def on_record(accession, record):
+            self.sequences[record.full_id] = record.sequence
+            if accession in plain:
+                self.relabel(accession, record.full_id)
+            if callback:
+                callback(accession, record)
+
+        def on_expanded(text, records):
+            self.expand(text, [record.full_id for record in records])
+
+        return fetcher.fetch_cells(pending, callback=on_record, expanded=on_expanded)[1]
+
+    def export_partitions(self, directory, workers=None):
+        """Write one FASTA file per non-empty partition; returns the written paths."""
+        return export.export_partitions(self, directory, workers)
+
+    def export_supermatrix(self, directory):
+        """Write concatenated.nex, concatenated.phy and a partitions.txt for RAxML/IQ-TREE."""
+        paths = [os.path.join(directory, name) for name in ("concatenated.nex", "concatenated.phy", "partitions.txt")]
+        export.write_supermatrix(self, *paths)
+        return paths
+
+
+def _fetchable(text):
+    return is_accession(text) or is_range(text) or is_query(text)
+
+
+def parse_block(text):
+    """Split pasted text into rows of cell texts: one row per line, tab-separated
+    columns (as copied from a spreadsheet); blank lines are skipped."""
+    return [line.split("\t") for line in text.splitlines() if line.strip()]
+
+
+def read_table(path):
+    """Read a CSV/TSV table: a header row of partition names, then one row per taxon
+    whose first field is the row name and the rest are accessions or sequence ids."""
+    delimiter = "," if path.lower().endswith(".csv") else "\t"
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [row for row in csv.reader(f, delimiter=delimiter) if any(field.strip() for field in row)]
+    if not rows:
+        return Matrix(0, 0)
+    header, body = rows[0], rows[1:]
+    matrix = Matrix(0, 0)
+    for name in header[1:]:
+        matrix.add_column(name.strip() or None)
+    for fields in body:
+        matrix.add_row(fields[0].strip() or None)
+        for col, text in enumerate(fields[1:]):
+            while col >= matrix.column_count:
+                matrix.add_column()
+            matrix.set_cell(matrix.row_count - 1, col, text.strip())
+    return matrix
@@ -0,0 +1,452 @@
+"""Batched, rate-limited download of nucleotide records from NCBI E-utilities.
+
+Accessions are deduplicated, posted to efetch in batches of comma-joined ids
+and the multi-record response is parsed as a stream. Plain FASTA is fetched
+unless full GenBank records (with their feature tables) are asked for.
+Batches run on a small pool of workers sharing one requests-per-second
+budget (NCBI allows 3/s without an API key and 10/s with one). Batches
+failing with HTTP 429/5xx or a dropped connection are retried with
+exponential backoff, and a running download can be cancelled. A batch that
+fails for any other reason, e.g. NCBI rejecting one of its ids, is split in
+halves until the offending ids are isolated.
+
+Records name their accession but not their numeric GI/UID, so UIDs are sent
+in batches of their own and matched to the records in response order.
+
+Entrez queries are run once through ESearch on the history server; the
+hits are then fetched by WebEnv/query_key in large pages instead of
+being sent back as id lists.
+
+Biopython and the HTTP client are imported on the first request rather
+than with this module: together they take longer to load than the rest of
+the GUI, and most sessions start without downloading anything.
+"""
+import io
+import random
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from seqmatrix import timing
+from seqmatrix.accessions import classify, is_accession, is_uid
+from seqmatrix.autoassign import source_qualifiers
+from seqmatrix.features import record_features
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+# Status codes worth retrying: rate limiting and server-side trouble
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+# Failure of an accession NCBI answered without a record for it
+NOT_FOUND = "not found"
+
+
+class FetchCancelled(Exception):
+    pass
+
+
+def is_transient(error):
+    import http.client
+    import urllib.error
+
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in TRANSIENT_STATUS
+    return isinstance(error, (urllib.error.URLError, http.client.HTTPException, ConnectionError, TimeoutError))
+
+
+class FetchedRecord(namedtuple("FetchedRecord", ["id", "description", "sequence"])):
+    __slots__ = ()
+
+    @property
+    def full_id(self):
+        # Same "ID description" label that importFasta uses for FASTA records
+        return f"{self.id} {self.description}".strip()
+
+
+def _parse(handle, rettype):
+    from Bio import SeqIO
+
+    return SeqIO.parse(handle, "fasta" if rettype == "fasta" else "genbank")
+
+
+def record_from_seqrecord(record):
+    description = record.description
+    if description.startswith(record.id):
+        description = description[len(record.id):]
+    return FetchedRecord(record.id, description.strip(), str(record.seq))
+
+
+def _match_uids(uids, records):
+    # NCBI answers an id list in the order asked, skipping the ids it does not know
+    if len(records) == len(uids):
+        return dict(zip(uids, records))
+    if len(uids) == 1 and not records:
+        return {}
+    raise ValueError(f"{len(records)} records returned for {len(uids)} UIDs")
+
+
+def unique_accessions(accessions):
+    seen = set()
+    unique = []
+    for accession in accessions:
+        accession = accession.strip()
+        if accession and accession not in seen:
+            seen.add(accession)
+            unique.append(accession)
+    return unique
+
+
+class RateLimiter:
+    """Hands out evenly spaced request slots to any number of threads."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self, cancelled=None):
+        """Sleep until the next free slot; returns early if the ``cancelled`` Event is set."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            if cancelled is not None:
+                cancelled.wait(slot - now)
+            else:
+                time.sleep(slot - now)
+
+
+class NCBIFetcher:
+    def __init__(self, email=None, api_key=None, batch_size=200, max_workers=3,
+                 requests_per_second=None, base_url=EUTILS_URL, timeout=60, tool="SeqMatrix",
+                 cache=None, lean=True, max_retries=4, backoff=1.0, page_size=500,
+                 max_search_records=100000):
+        if requests_per_second is None:
+            requests_per_second = 10 if api_key else 3
+        self.email = email
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.tool = tool
+        self.cache = cache
+        self.lean = lean
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # Records per efetch request when paging through ESearch results
+        self.page_size = page_size
+        self.max_search_records = max_search_records
+        self.limiter = RateLimiter(requests_per_second)
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop issuing requests; unfinished accessions are reported as cancelled."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _retrying(self, operation, *args):
+        attempt = 0
+        while True:
+            if self._cancelled.is_set():
+                raise FetchCancelled("cancelled")
+            try:
+                return operation(*args)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 4)
+                # HTTPError carries the response headers
+                headers = getattr(e, "headers", None)
+                retry_after = headers.get("Retry-After") if headers is not None else None
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                attempt += 1
+                if self._cancelled.wait(delay):
+                    raise FetchCancelled("cancelled")
+
+    def _request(self, endpoint, params):
+        params = dict(params, tool=self.tool)
+        if self.email:
+            params["email"] = self.email
+        if self.api_key:
+            params["api_key"] = self.api_key
+        import urllib.request
+
+        data = urllib.parse.urlencode(params).encode("ascii")
+        self.limiter.wait(self._cancelled)
+        if self._cancelled.is_set():
+            raise FetchCancelled("cancelled")
+        # POST keeps long id lists out of the URL
+        return urllib.request.urlopen(self.base_url + endpoint, data=data, timeout=self.timeout)
+
+    def _fetch_batch(self, batch, rettype):
+        return self._retrying(self._fetch_batch_once, batch, rettype)
+
+    def _fetch_batch_once(self, batch, rettype):
+        params = {"db": "nucleotide", "id": ",".join(batch), "rettype": rettype, "retmode": "text"}
+        with self._request("efetch.fcgi", params) as response:
+            handle = io.TextIOWrapper(response, encoding="utf-8")
+            records = list(_parse(handle, rettype))
+        if is_uid(batch[0]):
+            return _match_uids(batch, records)
+        wanted = {accession.upper(): accession for accession in batch}
+        found = {}
+        for record in records:
+            # The request may name the accession with or without its version
+            for key in (record.id, record.id.split(".")[0], record.name):
+                accession = wanted.get(key.upper())
+                if accession is not None and accession not in found:
+                    found[accession] = record
+        return found
+
+    def _run_batches(self, accessions, rettype, on_batch, on_done=None):
+        # Calls on_batch(batch, found) from the calling thread for each finished
+        # batch, and on_done(batch size) once a batch has succeeded or failed
+        failures = {}
+        named, uids = [], []
+        for accession in accessions:
+            if not is_accession(accession):
+                # Sent along, it would make NCBI reject the whole batch
+                failures[accession] = "not an accession number"
+            else:
+                (uids if is_uid(accession) else named).append(accession)
+        batches = [ids[i:i + self.batch_size] for ids in (named, uids) for i in range(0, len(ids), self.batch_size)]
+        if on_done and failures:
+            on_done(len(failures))
+        if not batches:
+            return failures
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            futures = {pool.submit(self._fetch_batch, batch, rettype): batch for batch in batches}
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = futures.pop(future)
+                    try:
+                        found = future.result()
+                    except Exception as e:
+                        if len(batch) > 1 and not is_transient(e) and not self._cancelled.is_set():
+                            # Halve the batch until the ids NCBI rejects are on their own
+                            half = len(batch) // 2
+                            for part in (batch[:half], batch[half:]):
+                                futures[pool.submit(self._fetch_batch, part, rettype)] = part
+                            continue
+                        for accession in batch:
+                            failures[accession] = str(e)
+                    else:
+                        on_batch(batch, found)
+                        for accession in batch:
+                            if accession not in found:
+                                failures[accession] = NOT_FOUND
+                    if on_done:
+                        on_done(len(batch))
+        return failures
+
+    def fetch(self, accessions, callback=None, progress=None):
+        """Download every distinct accession in ``accessions``.
+
+        Returns ``(records, failures)``: requested accession -> FetchedRecord,
+        and requested accession -> error message. ``callback(accession, record)``
+        is called from the calling thread as each record arrives, and
+        ``progress(done, total)`` as accessions are settled. Accessions found
+        in ``self.cache`` are not requested again.
+
+        In lean mode (the default) only FASTA is transferred; use
+        fetch_features() when gene features are actually needed.
+        """
+        with timing.stage("fetch") as stage:
+            return self._fetch(accessions, callback, progress, stage)
+
+    def _fetch(self, accessions, callback, progress, stage):
+        records = {}
+        missing = []
+        unique = unique_accessions(accessions)
+        for accession in unique:
+            record = self.cache.get(accession) if self.cache is not None else None
+            if record is None:
+                missing.append(accession)
+                continue
+            records[accession] = record
+            if callback:
+                callback(accession, record)
+        if self.cache is not None:
+            stage.add(hits=len(records), misses=len(missing))
+
+        def on_batch(batch, found):
+            if self.cache is not None and not self.lean:
+                self.cache.put_sources((record.id, source_qualifiers(record)) for record in found.values())
+            found = {accession: record_from_seqrecord(record) for accession, record in found.items()}
+            stage.add(records=len(found), bytes=sum(len(record.sequence) for record in found.values()))
+            if self.cache is not None:
+                self.cache.put_many(found.items())
+            for accession in batch:
+                record = found.get(accession)
+                if record is not None:
+                    records[accession] = record
+                    if callback:
+                        callback(accession, record)
+
+        done = len(records)
+        if progress:
+            progress(done, len(unique))
+
+        def on_done(count):
+            nonlocal done
+            done += count
+            progress(done, len(unique))
+
+        failures = self._run_batches(missing, "fasta" if self.lean else "gb", on_batch,
+                                     on_done if progress else None)
+        return records, failures
+
+    def esearch(self, term):
+        """Run an Entrez query on the history server; returns ``(count, webenv, query_key)``."""
+        from xml.etree import ElementTree
+
+        params = {"db": "nucleotide", "term": term, "usehistory": "y", "retmax": 0}
+
+        def search_once():
+            with self._request("esearch.fcgi", params) as response:
+                root = ElementTree.parse(response).getroot()
+            error = root.findtext("ERROR")
+            if error:
+                raise ValueError(error)
+            return int(root.findtext("Count", "0")), root.findtext("WebEnv"), root.findtext("QueryKey")
+
+        return self._retrying(search_once)
+
+    def _fetch_page_once(self, webenv, query_key, start, rettype):
+        params = {"db": "nucleotide", "WebEnv": webenv, "query_key": query_key, "retstart": start,
+                  "retmax": self.page_size, "rettype": rettype, "retmode": "text"}
+        with self._request("efetch.fcgi", params) as response:
+            handle = io.TextIOWrapper(response, encoding="utf-8")
+            return list(_parse(handle, rettype))
+
+    def search(self, term, callback=None, progress=None):
+        """Download every record matching the Entrez query ``term``.
+
+        Returns ``(records, failures)``: the FetchedRecords in ESearch order
+        (at most ``max_search_records``), and a description of the query or
+        of each failed page -> error message. ``callback(record)`` and
+        ``progress(done, total)`` are called as pages arrive.
+        """
+        with timing.stage("search") as stage:
+            try:
+                count, webenv, query_key = self.esearch(term)
+            except Exception as e:
+                return [], {term: str(e)}
+            count = min(count, self.max_search_records)
+            starts = list(range(0, count, self.page_size))
+            rettype = "fasta" if self.lean else "gb"
+            pages = {}
+            failures = {}
+            done = 0
+            if progress:
+                progress(done, count)
+            if starts:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(starts))) as pool:
+                    futures = {pool.submit(self._retrying, self._fetch_page_once, webenv, query_key, start, rettype):
+                               start for start in starts}
+                    for future in as_completed(futures):
+                        start = futures[future]
+                        size = min(self.page_size, count - start)
+                        try:
+                            found = [record_from_seqrecord(record) for record in future.result()[:size]]
+                        except Exception as e:
+                            failures[f"{term} [{start + 1}-{start + size}]"] = str(e)
+                        else:
+                            pages[start] = found
+                            stage.add(records=len(found), bytes=sum(len(record.sequence) for record in found))
+                            if self.cache is not None:
+                                self.cache.put_many((record.id, record) for record in found)
+                            if callback:
+                                for record in found:
+                                    callback(record)
+                        done += size
+                        if progress:
+                            progress(done, count)
+        return [record for start in sorted(pages) for record in pages[start]], failures
+
+    def fetch_cells(self, texts, callback=None, progress=None, expanded=None):
+        """Download what matrix cell texts stand for: accessions, accession ranges and Entrez queries.
+
+        Ranges are fetched along with the plain accessions and queries are
+        run through search(). ``expanded(text, records)`` is called for a
+        range or query once all of it has settled: every member fetched or
+        reported not found, every page of a query fetched. After an error
+        or a cancel it is not called, so the cell keeps its text and the
+        next run resumes it. ``callback(accession, record)`` and
+        ``progress(done, total)`` are as in fetch(). Returns ``(records,
+        failures)`` keyed by accession, record id, failed text or page.
+        """
+        cells = classify(texts)
+        failures = dict(cells.failures)
+        records = {}
+        members = [accession for accessions in cells.ranges.values() for accession in accessions]
+        if cells.accessions or members:
+            records, fetch_failures = self.fetch(cells.accessions + members, callback, progress)
+            failures.update(fetch_failures)
+        for text, accessions in cells.ranges.items():
+            if expanded and all(a in records or failures.get(a) == NOT_FOUND for a in accessions):
+                expanded(text, [records[a] for a in accessions if a in records])
+        for text in cells.queries:
+            if self.cancelled:
+                failures[text] = "cancelled"
+                continue
+            found, search_failures = self.search(
+                text, callback=(lambda record: callback(record.id, record)) if callback else None, progress=progress)
+            failures.update(search_failures)
+            records.update((record.id, record) for record in found)
+            if expanded and not search_failures:
+                expanded(text, found)
+        return records, failures
+
+    def fetch_features(self, accessions, progress=None):
+        """Download GenBank records and reduce them to their sequence and gene features.
+
+        Returns ``(records, failures)``: requested accession -> (FetchedRecord,
+        list of features.Feature), and requested accession -> error message.
+        Records are parsed once; after that they come from ``self.cache``,
+        which also keeps the specimen qualifiers of their source features for
+        auto_assign(). ``progress(done, total)`` is called as accessions are
+        settled.
+        """
+        with timing.stage("features") as stage:
+            records = {}
+            missing = []
+            unique = unique_accessions(accessions)
+            for accession in unique:
+                cached = self.cache.get_features(accession) if self.cache is not None else None
+                if cached is None:
+                    missing.append(accession)
+                else:
+                    records[accession] = cached
+            if self.cache is not None:
+                stage.add(hits=len(records), misses=len(missing))
+
+            def on_batch(batch, found):
+                items = [(accession, record_from_seqrecord(record), record_features(record))
+                         for accession, record in found.items()]
+                stage.add(records=len(items), bytes=sum(len(record.sequence) for _, record, _ in items))
+                if self.cache is not None:
+                    self.cache.put_features(items)
+                    self.cache.put_sources((record.id, source_qualifiers(record)) for record in found.values())
+                for accession, record, features in items:
+                    records[accession] = (record, features)
+
+            done = len(records)
+            if progress:
+                progress(done, len(unique))
+
+            def on_done(count):
+                nonlocal done
+                done += count
+                progress(done, len(unique))
+
+            failures = self._run_batches(missing, "gb", on_batch, on_done if progress else None)
+        return records, failures
@@ -0,0 +1,11 @@
+"""IUPAC nucleotide complements, for sequences held as str or as ASCII bytes."""
+
+_BASES = "ACGTURYKMBDHVNacgturykmbdhvn"
+_COMPLEMENTS = "TGCAAYRMKVHDBNtgcaayrmkvhdbn"
+_STR_COMPLEMENT = str.maketrans(_BASES, _COMPLEMENTS)
+_BYTES_COMPLEMENT = bytes.maketrans(_BASES.encode("ascii"), _COMPLEMENTS.encode("ascii"))
+
+
+def reverse_complement(sequence):
+    """The reverse complement of a str or bytes sequence; gaps and other characters are kept as they are."""
+    return sequence.translate(_BYTES_COMPLEMENT if isinstance(sequence, bytes) else _STR_COMPLEMENT)[::-1]
@@ -0,0 +1,282 @@
+"""Alignment readiness: orient and trim the sequences of each partition to a reference.
+
+Every sequence of a partition is compared with the partition's reference
+through shared k-mers. Only hits along the main diagonal count: those whose
+offset (position in the sequence minus position in the reference) lies
+within a band around the median offset, since chance hits scatter over
+every offset. When its reverse complement has more of them than the
+sequence itself it is reverse-complemented; the hits then locate the
+reference within it, and the flanks beyond the reference's ends are cut
+off. Sequences with too few hits to stand out from those an unrelated
+sequence of their length shares by chance (see Reference.min_hits()) are
+left as they are and reported as unmatched.
+
+The reference of a partition is taken from a FASTA file of references whose
+record ids are partition names, or else is the partition's sequence of
+median length. That one may itself be reverse-complemented; when most
+sequences come out reversed against it, the orientation is flipped so the
+majority keeps its own. k-mers are extracted and looked up with NumPy for a batch of
+sequences at a time, and the partitions run in a process pool, one task per
+partition, so large datasets use every core.
+
+The matrix itself is not changed: prepare() returns a copy for export whose
+cells read the oriented and trimmed sequences.
+"""
+import os
+from array import array
+from collections import ChainMap, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from seqmatrix import timing
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.matrix import Matrix
+from seqmatrix.nucleotides import reverse_complement
+
+DEFAULT_K = 12
+# A sequence is matched with at least this many hits in the band, plus
+# CHANCE_FACTOR times the number of k-mers it shares with the reference by chance
+MIN_HITS = 5
+CHANCE_FACTOR = 3
+# Hits this far off the main diagonal (as a fraction of the reference length) are ignored
+BAND = 0.2
+# Bytes of sequence looked up per batch, bounding the temporary arrays
+_BATCH_BYTES = 4 * 1024 * 1024
+# Up to this k, a table of every possible k-mer screens out misses before the sorted lookup
+_TABLE_K = 12
+
+PartitionReport = namedtuple("PartitionReport", ["name", "sequences", "reversed", "trimmed", "unmatched"])
+
+# 2-bit base codes; anything else is 4
+_BASES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate((b"Aa", b"Cc", b"Gg", b"TtUu")):
+    _BASES[list(_bases)] = _code
+
+
+def kmers(data, k=DEFAULT_K, breaks=None):
+    """Codes and start positions of the k-mers of a byte string.
+
+    k-mers with ambiguous bases or gaps are left out, and so are those
+    spanning one of the ``breaks`` (an array of offsets where joined
+    sequences start).
+    """
+    bases = _BASES[np.frombuffer(data, dtype=np.uint8)]
+    count = len(bases) - k + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = np.zeros(count, dtype=np.uint32 if k <= 16 else np.uint64)
+    invalid = np.zeros(count, dtype=bool)
+    for offset in range(k):
+        window = bases[offset:offset + count]
+        codes <<= 2
+        codes |= window & 3
+        invalid |= window > 3
+    if breaks is not None and len(breaks):
+        # A k-mer starting less than k bases before a break runs into the next sequence
+        for offset in range(1, k):
+            starts = breaks - offset
+            invalid[starts[(starts >= 0) & (starts < count)]] = True
+    positions = np.flatnonzero(~invalid)
+    return codes[positions], positions
+
+
+class Reference:
+    """The k-mers of a reference sequence, for finding it in other sequences."""
+
+    def __init__(self, data, k=DEFAULT_K):
+        self.length = len(data)
+        self.k = k
+        codes, positions = kmers(data, k)
+        order = np.argsort(codes, kind="stable")
+        codes, positions = codes[order], positions[order]
+        # A k-mer occurring more than once keeps its first position
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        self.codes, self.positions = codes[first], positions[first]
+        self.table = None
+        if k <= _TABLE_K:
+            self.table = np.zeros(4 ** k, dtype=bool)
+            self.table[self.codes] = True
+
+    def hits(self, sequences):
+        """The k-mers ``sequences`` (byte strings) share with the reference.
+
+        Returns (sequence index, position in the sequence, position in the
+        reference) arrays, ordered by sequence and position.
+        """
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(sequences) else lengths
+        codes, positions = kmers(b"".join(sequences), self.k, starts[1:])
+        if not len(self.codes) or not len(codes):
+            return positions[:0], positions[:0], positions[:0]
+        if self.table is not None:
+            shared = self.table[codes]
+            codes, positions = codes[shared], positions[shared]
+        index = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        shared = self.codes[index] == codes
+        positions = positions[shared]
+        owners = np.searchsorted(starts, positions, side="right") - 1
+        return owners, positions - starts[owners], self.positions[index[shared]]
+
+    def min_hits(self, length):
+        """Hits in the band a sequence of ``length`` bases needs to be taken for a match.
+
+        An unrelated sequence shares each of its k-mers with the reference
+        with a chance of (reference k-mers) / 4^k, which for 16.5 kb
+        mitogenomes and k=12 adds up to about 16 hits.
+        """
+        chance = max(length - self.k + 1, 0) * len(self.codes) / 4 ** self.k
+        return MIN_HITS + CHANCE_FACTOR * chance
+
+    def band(self, positions, reference_positions):
+        """The hits (as returned for one sequence by hits()) near the median diagonal."""
+        if not len(positions):
+            return positions, reference_positions
+        offsets = positions - reference_positions
+        band = np.abs(offsets - np.median(offsets)) <= BAND * self.length + self.k
+        return positions[band], reference_positions[band]
+
+    def locus(self, data, positions, reference_positions):
+        """(start, end) of the reference within ``data``, from the k-mer hits in the band."""
+        first, last = np.argmin(positions), np.argmax(positions)
+        start = int(positions[first] - reference_positions[first])
+        end = int(positions[last] + self.length - reference_positions[last])
+        return max(start, 0), min(end, len(data))
+
+
+def orient_and_trim(reference, sequences, k=DEFAULT_K):
+    """Orient and trim byte strings to ``reference`` (bytes, or None for the sequence of median length).
+
+    Returns one (sequence bytes or None if unchanged, reversed, trimmed,
+    matched) tuple per sequence.
+    """
+    median = reference is None
+    if median:
+        reference = sorted(sequences, key=len)[len(sequences) // 2] if sequences else b""
+    reference = Reference(reference, k)
+    results = []
+    first = 0
+    while first < len(sequences):
+        last, size = first, 0
+        while last < len(sequences) and (last == first or size + len(sequences[last]) <= _BATCH_BYTES):
+            size += len(sequences[last])
+            last += 1
+        forward = sequences[first:last]
+        reverse = [reverse_complement(data) for data in forward]
+        results.extend(_orient_batch(reference, forward, reverse))
+        first = last
+    matched = [result for result in results if result[3]]
+    if median and 2 * sum(result[1] for result in matched) > len(matched):
+        # The median sequence is on the minority's strand
+        results = [_flip(data, result) for data, result in zip(sequences, results)]
+    return results
+
+
+def _flip(original, result):
+    data, reversed_, trimmed, matched = result
+    if not matched:
+        return result
+    data = reverse_complement(original if data is None else data)
+    return data if trimmed or not reversed_ else None, not reversed_, trimmed, True
+
+
+def _orient_batch(reference, forward, reverse):
+    hits = reference.hits(forward), reference.hits(reverse)
+    # Where each sequence's hits begin in the hit arrays
+    bounds = [np.searchsorted(owners, np.arange(len(forward) + 1)) for owners, _, _ in hits]
+    for i in range(len(forward)):
+        banded = [reference.band(positions[bounds[strand][i]:bounds[strand][i + 1]],
+                                 reference_positions[bounds[strand][i]:bounds[strand][i + 1]])
+                  for strand, (_, positions, reference_positions) in enumerate(hits)]
+        reversed_ = bool(len(banded[1][0]) > len(banded[0][0]))
+        positions, reference_positions = banded[int(reversed_)]
+        if len(positions) < reference.min_hits(len(forward[i])):
+            yield None, False, False, False
+            continue
+        data = (reverse if reversed_ else forward)[i]
+        start, end = reference.locus(data, positions, reference_positions)
+        trimmed = start > 0 or end < len(data)
+        if trimmed:
+            data = data[start:end]
+        yield data if reversed_ or trimmed else None, reversed_, trimmed, True
+
+
+def read_references(path):
+    """Reference sequences by partition name (the record id) from a FASTA file."""
+    index = FastaIndex.build(path)
+    try:
+        return {label.split(" ", 1)[0]: index.sequence(label).encode("ascii", "replace") for label in index.records}
+    finally:
+        index.close()
+
+
+def _data(store, label):
+    data = store.data(label)
+    return data if data is not None else store[label].encode("ascii", "replace")
+
+
+def prepare(matrix, references=None, workers=None, k=DEFAULT_K, progress=None, mp_context=None):
+    """Orient and trim every partition of ``matrix`` to its reference.
+
+    ``references`` maps partition names to reference sequences (str or
+    bytes); other partitions use their sequence of median length.
+    ``progress(done, total)`` is called as partitions finish, and
+    ``mp_context`` is passed on to the process pool. Returns
+    ``(prepared, reports)``: a copy of the matrix to export, whose sequence
+    pool must not be modified, and a PartitionReport per partition.
+    """
+    references = references or {}
+    store, labels = matrix.sequences, matrix.labels
+    tasks = {}
+    for col, name in enumerate(matrix.column_names):
+        ids = [label_id for label_id in dict.fromkeys(matrix.column_ids(col))
+               if label_id and labels[label_id] in store]
+        if ids:
+            reference = references.get(name)
+            if isinstance(reference, str):
+                reference = reference.encode("ascii", "replace")
+            tasks[col] = (ids, reference)
+
+    prepared = Matrix.from_grid(list(matrix.row_names), list(matrix.column_names), list(labels),
+                                array("i", matrix.grid))
+    changed = {}
+    prepared.sequences = ChainMap(changed, store)
+    reports = [PartitionReport(name, 0, 0, 0, 0) for name in matrix.column_names]
+    if not tasks:
+        return prepared, reports
+
+    done = 0
+    with timing.stage("prepare") as stage, \
+            ProcessPoolExecutor(max_workers=workers or min(os.cpu_count() or 1, len(tasks)),
+                                mp_context=mp_context) as pool:
+        futures = {}
+        for col, (ids, reference) in tasks.items():
+            sequences = [_data(store, labels[label_id]) for label_id in ids]
+            stage.add(records=len(sequences), bytes=sum(map(len, sequences)))
+            futures[pool.submit(orient_and_trim, reference, sequences, k)] = col
+        for future in as_completed(futures):
+            col = futures[future]
+            ids = tasks[col][0]
+            results = future.result()
+            # Changed cells get a label of their own, since a sequence may sit in several partitions
+            new_ids = {}
+            for label_id, (data, _, _, _) in zip(ids, results):
+                if data is not None:
+                    label = f"{labels[label_id]}\t{col}"
+                    changed[label] = data.decode("ascii")
+                    new_ids[label_id] = prepared.intern(label)
+            if new_ids:
+                grid, columns = prepared.grid, prepared.column_count
+                for row in range(prepared.row_count):
+                    label_id = grid[row * columns + col]
+                    if label_id in new_ids:
+                        grid[row * columns + col] = new_ids[label_id]
+            reports[col] = PartitionReport(matrix.column_names[col], len(results),
+                                           sum(result[1] for result in results),
+                                           sum(result[2] for result in results),
+                                           sum(not result[3] for result in results))
+            done += 1
+            if progress:
+                progress(done, len(tasks))
+    return prepared, reports
@@ -0,0 +1,217 @@
+"""SeqMatrix project files.
+
+A project is a single SQLite file holding the row and column names, the
+label pool and the grid of a Matrix, plus every sequence in its pool.
+Sequences are stored once per distinct content, keyed by their SHA-1 and
+zlib-compressed; opening a project reads the grid only and pages sequences
+in when they are looked up. Saving again writes just the labels and
+sequences added or changed since the last save.
+
+Saving is split so it can run in the background: snapshot() is cheap and
+runs where the matrix is edited, write() does the hashing, compression and
+I/O, and adopt() afterwards lets the store read the saved sequences back
+from the project instead of holding them in memory.
+"""
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import zlib
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+from seqmatrix import timing
+from seqmatrix.matrix import Matrix
+
+PROJECT_SUFFIX = ".smproj"
+FORMAT_VERSION = 1
+# Decompressed sequences kept around, by hash; redundant datasets hit it often
+_READ_CACHE_SIZE = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    hash TEXT PRIMARY KEY,
+    length INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    label TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+"""
+
+# Sequences are (label, index it is read from or None, the in-memory bytes or None);
+# pool is every label in the store, so labels deleted since the last save are dropped
+Snapshot = namedtuple("Snapshot", ["row_names", "column_names", "labels", "grid", "sequences", "pool"])
+
+
+def is_project(path):
+    return path.lower().endswith(PROJECT_SUFFIX)
+
+
+def _grid_bytes(grid):
+    # Grids are stored little-endian whatever machine wrote them
+    if sys.byteorder == "big":
+        grid = array("i", grid)
+        grid.byteswap()
+    return zlib.compress(grid.tobytes())
+
+
+def _grid_from_bytes(data):
+    grid = array("i")
+    grid.frombytes(zlib.decompress(data))
+    if sys.byteorder == "big":
+        grid.byteswap()
+    return grid
+
+
+class ProjectFile:
+    def __init__(self, path):
+        self.path = path
+        # label -> hash of its sequence, for everything saved so far
+        self.records = {}
+        self._hashes = set()
+        self._saved_labels = []
+        # Writes happen on the autosave thread; sequences are read from any thread
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._read = lru_cache(maxsize=_READ_CACHE_SIZE)(self._read_uncached)
+        version = self._meta("version")
+        if version is not None and version > FORMAT_VERSION:
+            raise ValueError(f"{path} was written by a newer SeqMatrix (format {version})")
+        self.records = dict(self._db.execute("SELECT label, hash FROM entries"))
+        self._hashes = set(self.records.values())
+
+    def _meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def __len__(self):
+        return len(self.records)
+
+    def load(self):
+        """The saved matrix; its sequences stay in the project until looked up."""
+        grid = self._meta("grid")
+        if grid is None:
+            return Matrix()
+        labels = [text for _, text in self._db.execute("SELECT id, text FROM labels ORDER BY id")]
+        matrix = Matrix.from_grid(json.loads(self._meta("row_names")), json.loads(self._meta("column_names")),
+                                  labels, _grid_from_bytes(grid))
+        matrix.sequences.add_index(self)
+        self._saved_labels = labels
+        return matrix
+
+    def _read_uncached(self, digest):
+        with self._read_lock:
+            row = self._reader.execute("SELECT data FROM sequences WHERE hash = ?", (digest,)).fetchone()
+        return zlib.decompress(row[0]).decode("ascii")
+
+    def sequence(self, label):
+        return self._read(self.records[label])
+
+    def digest(self, label):
+        # Saved sequences are keyed by the hash SequenceStore uses
+        return bytes.fromhex(self.records[label])
+
+    def snapshot(self, matrix):
+        """Capture what write() needs; cheap, so it can run on the GUI thread."""
+        store = matrix.sequences
+        sequences = []
+        for label in store:
+            source = store.source(label)
+            if source is not self:
+                sequences.append((label, source, store.data(label) if source is None else None))
+        return Snapshot(list(matrix.row_names), list(matrix.column_names), list(matrix.labels),
+                        array("i", matrix.grid), sequences, set(store))
+
+    def write(self, snapshot, progress=None):
+        """Store a snapshot; only labels and sequences not saved before are written.
+
+        ``progress(done, total)`` is called as sequences are written. Returns
+        the number of labels whose sequence was saved or changed. Labels no
+        longer in the store are removed, and so are sequences nothing refers to.
+        """
+        with self._write_lock, self._db, timing.stage("save") as stage:
+            db = self._db
+            db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("version", FORMAT_VERSION),
+                ("row_names", json.dumps(snapshot.row_names)),
+                ("column_names", json.dumps(snapshot.column_names)),
+                ("grid", _grid_bytes(snapshot.grid)),
+            ])
+            saved = self._saved_labels
+            db.executemany("INSERT OR REPLACE INTO labels (id, text) VALUES (?, ?)",
+                           [(label_id, text) for label_id, text in enumerate(snapshot.labels)
+                            if label_id >= len(saved) or saved[label_id] != text])
+            db.execute("DELETE FROM labels WHERE id >= ?", (len(snapshot.labels),))
+
+            total = len(snapshot.sequences)
+            # Only taken over once the transaction has committed
+            hashes = set()
+            records = {}
+            for done, (label, source, data) in enumerate(snapshot.sequences, 1):
+                if data is None:
+                    data = source.sequence(label).encode("ascii", "replace")
+                digest = hashlib.sha1(data).hexdigest()
+                stage.add(records=1, bytes=len(data))
+                if digest not in self._hashes and digest not in hashes:
+                    db.execute("INSERT OR REPLACE INTO sequences (hash, length, data) VALUES (?, ?, ?)",
+                               (digest, len(data), zlib.compress(data)))
+                    hashes.add(digest)
+                if self.records.get(label) != digest:
+                    db.execute("INSERT OR REPLACE INTO entries (label, hash) VALUES (?, ?)", (label, digest))
+                    records[label] = digest
+                if progress is not None:
+                    progress(done, total)
+            removed = [label for label in self.records if label not in snapshot.pool]
+            db.executemany("DELETE FROM entries WHERE label = ?", [(label,) for label in removed])
+            if removed or any(label in self.records for label in records):
+                # Deleted and changed sequences may have left contents nothing refers to
+                db.execute("DELETE FROM sequences WHERE hash NOT IN (SELECT hash FROM entries)")
+        for label in removed:
+            del self.records[label]
+        self._saved_labels = snapshot.labels
+        self.records.update(records)
+        self._hashes = set(self.records.values())
+        return len(records)
+
+    def adopt(self, store, snapshot):
+        """Read the sequences saved from ``snapshot`` back from the project from now on.
+
+        Labels changed in ``store`` since the snapshot was taken are left alone.
+        """
+        adopted = []
+        for label, source, data in snapshot.sequences:
+            if store.source(label) is not source or label not in self.records:
+                continue
+            if source is None and store.data(label) is not data:
+                continue
+            adopted.append(label)
+        store.add_index(self, adopted, compare=False)
+
+    def save(self, matrix):
+        """Snapshot, write and adopt in one go."""
+        snapshot = self.snapshot(matrix)
+        written = self.write(snapshot)
+        self.adopt(matrix.sequences, snapshot)
+        return written
+
+    def close(self):
+        with self._write_lock:
+            self._reader.close()
+            self._db.close()
@@ -0,0 +1,234 @@
+"""Per-cell and per-partition statistics of a Matrix, computed with NumPy.
+
+Base composition is counted once per label of the pool (not per cell) and
+cached by sequence content, so refreshing after a drop or a download only
+counts the sequences that are new. Finding those is cheap; counting them,
+which may read a whole project from disk, can run on a worker thread. Sequences are counted in batches: their
+bytes are concatenated, mapped to a base class through a lookup table and
+tallied with one bincount. Per-partition figures come from indexing those
+per-label counts with the grid.
+
+A cell is a length outlier when it differs from the median length of its
+partition by more than OUTLIER_Z robust standard deviations (1.4826 * MAD)
+and by more than OUTLIER_FRACTION of the median, e.g. a 16 kb mitogenome in
+a column of 650 bp COI barcodes.
+"""
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+from seqmatrix import timing
+
+OUTLIER_Z = 3.5
+OUTLIER_FRACTION = 0.5
+# Partitions with fewer sequences have no meaningful median
+OUTLIER_MIN_SEQUENCES = 3
+# Bytes counted per batch, bounding the temporary arrays
+_BATCH_BYTES = 8 * 1024 * 1024
+
+# Base classes: A/T/U, G/C, ambiguous or missing (N, IUPAC codes, ?), gap
+AT, GC, AMBIGUOUS, GAP = range(4)
+_CLASSES = np.full(256, AMBIGUOUS, dtype=np.int64)
+for _bases, _cls in ((b"ATUatu", AT), (b"GCgc", GC), (b"-.", GAP)):
+    _CLASSES[list(_bases)] = _cls
+
+CellStats = namedtuple("CellStats", ["length", "gc", "ambiguous", "gaps"])
+PartitionStats = namedtuple("PartitionStats", ["name", "sequences", "min_length", "median_length", "max_length",
+                                               "gc", "ambiguous", "gaps", "outliers"])
+Outlier = namedtuple("Outlier", ["row", "column", "label", "length", "median_length"])
+
+
+def base_counts(sequences):
+    """(n, 4) array of AT, GC, ambiguous and gap counts of byte strings."""
+    counts = np.zeros((len(sequences), 4), dtype=np.int64)
+    start = 0
+    while start < len(sequences):
+        end, size = start, 0
+        while end < len(sequences) and (end == start or size + len(sequences[end]) <= _BATCH_BYTES):
+            size += len(sequences[end])
+            end += 1
+        batch = sequences[start:end]
+        lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+        classes = _CLASSES[np.frombuffer(b"".join(batch), dtype=np.uint8)]
+        owner = np.repeat(np.arange(len(batch), dtype=np.int64), lengths)
+        counts[start:end] = np.bincount(owner * 4 + classes, minlength=len(batch) * 4).reshape(-1, 4)
+        start = end
+    return counts
+
+
+def _fractions(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    length = counts.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gc = counts[..., GC] / (counts[..., AT] + counts[..., GC])
+        ambiguous = counts[..., AMBIGUOUS] / length
+        gaps = counts[..., GAP] / length
+    return length, gc, ambiguous, gaps
+
+
+class MatrixStats:
+    def __init__(self, matrix):
+        self.matrix = matrix
+        # Per label id: content key it was counted for, whether it has a sequence, base counts
+        self._keys = [None]
+        self._present = np.zeros(1, dtype=bool)
+        self._counts = np.zeros((1, 4), dtype=np.int64)
+        # content key -> base counts, shared by labels with the same sequence
+        self._by_key = {}
+
+    def update(self):
+        """Count the labels whose sequence appeared or changed since the last update."""
+        todo = self.changed()
+        if todo:
+            self.apply(todo, self.count(todo))
+        return len(todo)
+
+    def changed(self):
+        """The labels update() would count, as ``(label id, content key, bytes or None)`` tuples.
+
+        Cheap: it only looks up content keys and in-memory bytes. Sequences
+        read from an index are left to count(), which may run on another
+        thread; apply() then stores the result.
+        """
+        labels, store = self.matrix.labels, self.matrix.sequences
+        size = len(labels)
+        if size > len(self._keys):
+            grow = size - len(self._keys)
+            self._keys.extend([None] * grow)
+            self._present = np.concatenate([self._present, np.zeros(grow, dtype=bool)])
+            self._counts = np.concatenate([self._counts, np.zeros((grow, 4), dtype=np.int64)])
+        todo = []
+        for label_id in range(1, size):
+            key = store.content_key(labels[label_id])
+            if key == self._keys[label_id]:
+                continue
+            if key is None:
+                self._keys[label_id] = None
+                self._present[label_id] = False
+            elif key in self._by_key:
+                self._keys[label_id] = key
+                self._present[label_id] = True
+                self._counts[label_id] = self._by_key[key]
+            else:
+                todo.append((label_id, key, store.data(labels[label_id])))
+        return todo
+
+    @staticmethod
+    def count(todo, failures=None):
+        """Base counts of the sequences of changed(); reads indexed ones from their file.
+
+        With a ``failures`` dict, sequences that cannot be read (their file
+        was moved or deleted) are entered there as label id -> error instead
+        of raising; pass it on to apply().
+        """
+        sequences = []
+        for label_id, key, data in todo:
+            if data is None:
+                # (index, label): a FastaIndex or project, safe to read from any thread
+                index, label = key
+                try:
+                    data = index.sequence(label).encode("ascii", "replace")
+                except Exception as e:
+                    if failures is None:
+                        raise
+                    failures[label_id] = f"{label}: {e}"
+                    data = b""
+            sequences.append(data)
+        with timing.stage("stats") as stage:
+            counts = base_counts(sequences)
+            stage.add(records=len(sequences), bytes=sum(map(len, sequences)))
+        return counts
+
+    def apply(self, todo, counts, failures=()):
+        """Store the result of count(); labels in ``failures`` count as having no sequence."""
+        for (label_id, key, _), row in zip(todo, counts):
+            self._keys[label_id] = key
+            if label_id in failures:
+                # Not read again until its sequence changes
+                self._present[label_id] = False
+                continue
+            self._by_key[key] = row
+            self._present[label_id] = True
+            self._counts[label_id] = row
+
+    def _grid(self):
+        matrix = self.matrix
+        # A copy, so the matrix can still grow while the result is around
+        return np.frombuffer(matrix.grid, dtype=np.intc).reshape(matrix.row_count, matrix.column_count).copy()
+
+    def cell(self, row, col):
+        """CellStats of a cell, or None when it holds no sequence (as of the last update)."""
+        label_id = self.matrix.grid[row * self.matrix.column_count + col]
+        if label_id >= len(self._keys) or not self._present[label_id]:
+            return None
+        return CellStats(*(float(value) for value in _fractions(self._counts[label_id])))
+
+    def _columns(self):
+        # (col, row indices holding a sequence, their lengths, median, outlier mask)
+        grid = self._grid()
+        lengths = self._counts.sum(axis=1)
+        for col in range(self.matrix.column_count):
+            ids = grid[:, col]
+            rows = np.flatnonzero(self._present[ids])
+            column_lengths = lengths[ids[rows]]
+            median = float(np.median(column_lengths)) if len(rows) else 0.0
+            outliers = np.zeros(len(rows), dtype=bool)
+            if len(rows) >= OUTLIER_MIN_SEQUENCES:
+                deviation = np.abs(column_lengths - median)
+                mad = float(np.median(deviation))
+                outliers = deviation > max(OUTLIER_Z * 1.4826 * mad, OUTLIER_FRACTION * median)
+            yield col, rows, column_lengths, median, outliers
+
+    def partitions(self):
+        """PartitionStats of every partition, from the last update."""
+        grid = self._grid()
+        result = []
+        for col, rows, lengths, median, outliers in self._columns():
+            if not len(rows):
+                result.append(PartitionStats(self.matrix.column_names[col], 0, 0, 0.0, 0,
+                                             float("nan"), float("nan"), float("nan"), 0))
+                continue
+            _, gc, ambiguous, gaps = _fractions(self._counts[grid[rows, col]].sum(axis=0))
+            result.append(PartitionStats(self.matrix.column_names[col], len(rows), int(lengths.min()), median,
+                                         int(lengths.max()), float(gc), float(ambiguous), float(gaps),
+                                         int(outliers.sum())))
+        return result
+
+    def outliers(self):
+        """Cells whose length is far off the median of their partition, from the last update."""
+        matrix = self.matrix
+        found = []
+        for col, rows, lengths, median, outliers in self._columns():
+            for row, length in zip(rows[outliers], lengths[outliers]):
+                found.append(Outlier(matrix.row_names[row], matrix.column_names[col],
+                                     matrix.cell(int(row), col), int(length), median))
+        return found
+
+    def write_tsv(self, path):
+        """Write the partition summary to ``path``."""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+            writer.writerow(PartitionStats._fields)
+            for partition in self.partitions():
+                writer.writerow([_format(value) for value in partition])
+
+    def write_cells_tsv(self, path):
+        """Write one line per cell holding a sequence, with its outlier flag."""
+        matrix = self.matrix
+        grid = self._grid()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+            writer.writerow(["row", "column", "label", "length", "gc", "ambiguous", "gaps", "outlier"])
+            for col, rows, lengths, median, outliers in self._columns():
+                length, gc, ambiguous, gaps = _fractions(self._counts[grid[rows, col]])
+                for i, row in enumerate(rows):
+                    writer.writerow([matrix.row_names[row], matrix.column_names[col], matrix.cell(int(row), col),
+                                     int(length[i]), _format(gc[i]), _format(ambiguous[i]), _format(gaps[i]),
+                                     "yes" if outliers[i] else ""])
+
+
+def _format(value):
+    if isinstance(value, (float, np.floating)):
+        return "" if np.isnan(value) else f"{value:.4f}"
+    return value
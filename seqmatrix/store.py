@@ -0,0 +1,146 @@
+"""Mapping of sequence labels to sequences, some of them kept on disk.
+
+Sequences that were downloaded or set directly are held in memory,
+content-addressed: each label maps to the SHA-1 of its sequence and each
+distinct sequence is kept once, as ASCII bytes, however many labels (or
+overlapping imports and downloads) share it. Records added from an index
+(a FastaIndex or a saved project) stay in their file and are read only when
+looked up, e.g. while exporting. Indexes provide the SHA-1 of each record
+through digest(label), so records are compared without reading them twice.
+
+Giving a label a sequence different from the one it already had replaces
+it and is recorded in ``collisions``.
+"""
+import hashlib
+from collections import Counter, namedtuple
+from collections.abc import MutableMapping
+
+Collision = namedtuple("Collision", ["label", "old_length", "new_length"])
+StoreStats = namedtuple("StoreStats", ["labels", "in_memory", "unique", "stored_bytes", "logical_bytes", "indexed"])
+
+
+def _encode(sequence):
+    return sequence.encode("ascii", "replace") if isinstance(sequence, str) else bytes(sequence)
+
+
+class SequenceStore(MutableMapping):
+    def __init__(self):
+        # label -> hash, hash -> sequence bytes, hash -> number of labels using it
+        self._hashes = {}
+        self._blobs = {}
+        self._refs = Counter()
+        # label -> index holding the record
+        self._indexed = {}
+        self._stored_bytes = 0
+        self._logical_bytes = 0
+        self.collisions = []
+
+    def __getitem__(self, label):
+        digest = self._hashes.get(label)
+        if digest is not None:
+            return self._blobs[digest].decode("ascii")
+        return self._indexed[label].sequence(label)
+
+    def __setitem__(self, label, sequence):
+        data = _encode(sequence)
+        digest = hashlib.sha1(data).digest()
+        old = self._hashes.get(label)
+        if old == digest:
+            return
+        if old is not None:
+            self.collisions.append(Collision(label, len(self._blobs[old]), len(data)))
+            self._release(old)
+        elif label in self._indexed:
+            index = self._indexed.pop(label)
+            if index.digest(label) != digest:
+                self.collisions.append(Collision(label, len(index.sequence(label)), len(data)))
+        if digest not in self._blobs:
+            self._blobs[digest] = data
+            self._stored_bytes += len(data)
+        self._refs[digest] += 1
+        self._logical_bytes += len(data)
+        self._hashes[label] = digest
+
+    def _release(self, digest):
+        size = len(self._blobs[digest])
+        self._logical_bytes -= size
+        self._refs[digest] -= 1
+        if not self._refs[digest]:
+            del self._refs[digest]
+            del self._blobs[digest]
+            self._stored_bytes -= size
+
+    def __delitem__(self, label):
+        digest = self._hashes.pop(label, None)
+        if digest is not None:
+            self._release(digest)
+        found = self._indexed.pop(label, None) is not None or digest is not None
+        if not found:
+            raise KeyError(label)
+
+    def __contains__(self, label):
+        return label in self._hashes or label in self._indexed
+
+    def __iter__(self):
+        yield from self._hashes
+        yield from self._indexed
+
+    def __len__(self):
+        return len(self._hashes) + len(self._indexed)
+
+    def add_index(self, index, labels=None, compare=True):
+        """Make the records of ``index`` (all of them, or just ``labels``) available without reading them.
+
+        Labels that already had a sequence are compared with the new record
+        by digest and collisions recorded, unless ``compare`` is false because
+        the caller knows they hold the same sequence. Records are only read
+        for the lengths of those that differ.
+        """
+        labels = index.records.keys() if labels is None else labels
+        for label in self._hashes.keys() & labels:
+            digest = self._hashes.pop(label)
+            if compare and index.digest(label) != digest:
+                self.collisions.append(Collision(label, len(self._blobs[digest]), len(index.sequence(label))))
+            self._release(digest)
+        if compare:
+            for label in self._indexed.keys() & labels:
+                previous = self._indexed[label]
+                if previous is not index and previous.digest(label) != index.digest(label):
+                    self.collisions.append(Collision(label, len(previous.sequence(label)),
+                                                     len(index.sequence(label))))
+        self._indexed.update(dict.fromkeys(labels, index))
+
+    def sources(self):
+        """label -> index it is read from, or None when held in memory; a copy,
+        so it can be handed to another thread."""
+        sources = dict.fromkeys(self._hashes)
+        sources.update(self._indexed)
+        return sources
+
+    def source(self, label):
+        """The index ``label`` is read from, or None when its sequence is held in memory."""
+        return self._indexed.get(label)
+
+    def data(self, label):
+        """The shared bytes of an in-memory sequence, or None."""
+        digest = self._hashes.get(label)
+        return None if digest is None else self._blobs[digest]
+
+    def content_key(self, label):
+        """Identifies the sequence of ``label``: its hash when held in memory,
+        (index, label) when read from an index, None when there is none."""
+        digest = self._hashes.get(label)
+        if digest is not None:
+            return digest
+        index = self._indexed.get(label)
+        return None if index is None else (index, label)
+
+    def take_collisions(self):
+        """Collisions recorded since the last call."""
+        collisions, self.collisions = self.collisions, []
+        return collisions
+
+    def stats(self):
+        """Label counts and the bytes held in memory versus what per-label copies would take."""
+        return StoreStats(len(self), len(self._hashes), len(self._blobs), self._stored_bytes,
+                          self._logical_bytes, len(self._indexed))
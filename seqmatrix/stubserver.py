@@ -0,0 +1,165 @@
+"""Local stand-in for the NCBI efetch and esearch endpoints.
+
+Serves records from memory so the download engine can be exercised offline:
+
+    with StubEutilsServer() as server:
+        server.add(seqrecord)
+        fetcher = NCBIFetcher(base_url=server.url)
+
+ESearch results are kept on a tiny history server, so efetch also accepts
+WebEnv/query_key with retstart/retmax. A query matches the records whose
+FASTA header contains every word of it, field tags and AND ignored, unless
+its hits were registered with add_query(). Records may also be served
+under a numeric UID, and reject() makes any efetch naming an id fail with
+HTTP 400, as NCBI does for some withdrawn or malformed ids.
+"""
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        self._dispatch(url.path, urllib.parse.parse_qs(url.query))
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("ascii")
+        self._dispatch(url.path, urllib.parse.parse_qs(body))
+
+    def _dispatch(self, path, query):
+        params = {key: values[-1] for key, values in query.items()}
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests.append((path.rsplit("/", 1)[-1], params))
+            status = stub.errors.pop(0) if stub.errors else None
+        if status is not None:
+            self.send_error(status)
+            return
+        if path.endswith("/efetch.fcgi"):
+            body = stub.efetch(params)
+        elif path.endswith("/esearch.fcgi"):
+            body = stub.esearch(params)
+        else:
+            self.send_error(404)
+            return
+        if body is None:
+            self.send_error(400)
+            return
+        payload = body.encode("utf-8")
+        with stub.lock:
+            stub.bytes_sent += len(payload)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubEutilsServer:
+    def __init__(self, records=()):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.bytes_sent = 0
+        # HTTP status codes to answer the next requests with
+        self.errors = []
+        # Ids whose efetch requests are answered with HTTP 400
+        self.rejected = set()
+        self._texts = {}
+        # Primary accessions in the order they were added, for searching
+        self._order = []
+        self._queries = {}
+        # WebEnv -> hit lists by query_key
+        self._history = {}
+        for record in records:
+            self.add(record)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def add(self, record, uid=None):
+        """Serve a Bio.SeqRecord under its versioned and unversioned accession, and its ``uid`` if given."""
+        record.annotations.setdefault("molecule_type", "DNA")
+        texts = {"gb": record.format("genbank"), "fasta": record.format("fasta")}
+        if record.id.upper() not in self._texts:
+            self._order.append(record.id.upper())
+        self._texts[record.id.upper()] = texts
+        self._texts[record.id.split(".")[0].upper()] = texts
+        if uid is not None:
+            self._texts[str(uid)] = texts
+
+    def reject(self, *ids):
+        """Answer every efetch naming one of these ids with HTTP 400."""
+        with self.lock:
+            self.rejected.update(accession.upper() for accession in ids)
+
+    def add_query(self, term, accessions):
+        """Make ESearch answer ``term`` with these accessions."""
+        self._queries[term] = [accession.upper() for accession in accessions]
+
+    def _matches(self, term):
+        if term in self._queries:
+            return self._queries[term]
+        words = [word.lower() for word in re.sub(r"\[[^\]]*\]|\b(?:AND|OR|NOT)\b", " ", term).split()]
+        return [accession for accession in self._order
+                if all(word in self._texts[accession]["fasta"].split("\n", 1)[0].lower() for word in words)]
+
+    def esearch(self, params):
+        hits = self._matches(params.get("term", ""))
+        with self.lock:
+            webenv = f"MCID_{len(self._history) + 1}"
+            self._history[webenv] = {"1": hits}
+        return ("<?xml version=\"1.0\" ?>\n<eSearchResult>"
+                f"<Count>{len(hits)}</Count><RetMax>0</RetMax><RetStart>0</RetStart>"
+                f"<QueryKey>1</QueryKey><WebEnv>{escape(webenv)}</WebEnv><IdList></IdList>"
+                "</eSearchResult>\n")
+
+    def fail_next(self, *statuses):
+        """Answer the next requests with these HTTP errors, e.g. fail_next(429, 503)."""
+        with self.lock:
+            self.errors.extend(statuses)
+
+    def efetch(self, params):
+        rettype = params.get("rettype", "gb")
+        if "WebEnv" in params:
+            hits = self._history.get(params["WebEnv"], {}).get(params.get("query_key"), [])
+            start = int(params.get("retstart", 0))
+            accessions = hits[start:start + int(params.get("retmax", 20))]
+        else:
+            accessions = params.get("id", "").split(",")
+            if any(accession.strip().upper() in self.rejected for accession in accessions):
+                return None
+        chunks = []
+        for accession in accessions:
+            texts = self._texts.get(accession.strip().upper())
+            if texts is not None:
+                chunks.append(texts[rettype])
+        return "".join(chunks)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
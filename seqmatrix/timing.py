@@ -0,0 +1,120 @@
+"""Per-stage timing and throughput counters.
+
+Import, download, paste/format and export each run inside a stage that
+counts records, bytes and cache hits. Timing is off by default and a
+disabled stage is a shared no-op object, so the hot paths pay a single
+check. Turn it on with enable() or SEQMATRIX_TIMING=1. Every finished stage
+is logged on the "seqmatrix.timing" logger and added to the totals that
+report() summarizes.
+
+    with timing.stage("import") as stage:
+        ...
+        stage.add(records=len(index), bytes=size)
+"""
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger("seqmatrix.timing")
+
+StageTotals = namedtuple("StageTotals", ["name", "calls", "seconds", "records", "bytes", "hits", "misses"])
+
+_enabled = os.environ.get("SEQMATRIX_TIMING", "") not in ("", "0")
+_lock = threading.Lock()
+_totals = {}
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def enabled():
+    return _enabled
+
+
+def describe(name, seconds, records=0, bytes=0, hits=0, misses=0, calls=1):
+    """One line summarizing a stage, e.g. "import: 1200 records, 3.1 MB in 0.05 s (...)"."""
+    parts = []
+    rates = []
+    if records:
+        parts.append(f"{records} records")
+        if seconds > 0:
+            rates.append(f"{records / seconds:.0f} records/s")
+    if bytes:
+        parts.append(f"{bytes / 1e6:.1f} MB")
+        if seconds > 0:
+            rates.append(f"{bytes / 1e6 / seconds:.1f} MB/s")
+    if hits or misses:
+        rates.append(f"cache hit rate {hits / (hits + misses):.0%}")
+    line = f"{name}: " + (", ".join(parts) + " in " if parts else "") + f"{seconds:.3f} s"
+    if calls > 1:
+        line += f" over {calls} calls"
+    return line + (f" ({', '.join(rates)})" if rates else "")
+
+
+class Stage:
+    __slots__ = ("name", "records", "bytes", "hits", "misses", "_start")
+
+    def __init__(self, name):
+        self.name = name
+        self.records = self.bytes = self.hits = self.misses = 0
+        self._start = None
+
+    def add(self, records=0, bytes=0, hits=0, misses=0):
+        self.records += records
+        self.bytes += bytes
+        self.hits += hits
+        self.misses += misses
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        with _lock:
+            total = _totals.get(self.name) or StageTotals(self.name, 0, 0.0, 0, 0, 0, 0)
+            _totals[self.name] = StageTotals(self.name, total.calls + 1, total.seconds + seconds,
+                                             total.records + self.records, total.bytes + self.bytes,
+                                             total.hits + self.hits, total.misses + self.misses)
+        logger.info(describe(self.name, seconds, self.records, self.bytes, self.hits, self.misses))
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def add(self, records=0, bytes=0, hits=0, misses=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """A context manager timing one run of ``name``; a no-op while timing is off."""
+    return Stage(name) if _enabled else _NULL_STAGE
+
+
+def totals():
+    with _lock:
+        return list(_totals.values())
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+
+
+def report():
+    """One describe() line per stage run so far."""
+    return [describe(t.name, t.seconds, t.records, t.bytes, t.hits, t.misses, t.calls) for t in totals()]
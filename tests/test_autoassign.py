@@ -0,0 +1,38 @@
+"""Reading specimens from record descriptions and assigning records to cells."""
+import pytest
+
+from seqmatrix.autoassign import auto_assign, specimen_of
+from seqmatrix.matrix import Matrix
+
+
+@pytest.mark.parametrize("description, specimen", [
+    ("MN100001.1 Carabus voucher ZFMK-123 16S ribosomal RNA gene, partial sequence", "ZFMK-123"),
+    ("MN100002.1 Carabus isolate B12 12S ribosomal RNA gene, partial sequence", "B12"),
+    ("MN100003.1 Carabus voucher MNHN 12-345 cytochrome oxidase subunit I (COI) gene", "MNHN 12-345"),
+    ("MN100004.1 Aspergillus strain CBS 123.45. beta-tubulin gene", "CBS 123.45"),
+    ("MN100005.1 Carabus voucher CBS 16S rRNA gene", "CBS"),
+    ("MN100006.1 Carabus sp. COI gene", None),
+])
+def test_specimen_of(description, specimen):
+    assert specimen_of(description) == specimen
+
+
+def test_qualifiers_take_precedence():
+    assert specimen_of("MN100001.1 Carabus isolate B12 COI", {"specimen_voucher": "ZFMK 1"}) == "ZFMK 1"
+
+
+def test_auto_assign():
+    matrix = Matrix(1, 1)
+    records = [("MN1.1 Carabus voucher MNHN 12-345 16S ribosomal RNA gene", None),
+               ("MN2.1 Carabus voucher mnhn12345 cytochrome oxidase subunit I (COI) gene", None),
+               ("MN3.1 Carabus voucher ZFMK-123 16S ribosomal RNA gene", None),
+               ("MN4.1 Carabus voucher ZFMK-123 16S ribosomal RNA gene", None),
+               ("MN5.1 Carabus sp. COI gene", None)]
+    result = auto_assign(matrix, records)
+    assert result.assigned == 3
+    assert [(c.row, c.column, c.label) for c in result.conflicts] == [("ZFMK-123", "16S", records[3][0])]
+    assert result.unassigned == [records[4][0]]
+    assert matrix.row_names == ["MNHN 12-345", "ZFMK-123"]
+    assert matrix.column_names == ["16S", "COX1"]
+    assert matrix.cell(0, 1) == records[1][0]
+    assert matrix.cell(1, 0) == records[2][0]
@@ -0,0 +1,22 @@
+"""Partition files and the supermatrix."""
+from seqmatrix.export import charsets, supermatrix_layout, unique_names
+from seqmatrix.matrix import Matrix
+
+
+def test_unique_names():
+    assert unique_names(["COI", "cytb", "COI", "coi", "COI_2"]) == ["COI", "cytb", "COI_3", "coi_4", "COI_2"]
+
+
+def test_partitions_with_the_same_name_get_files_of_their_own(tmp_path):
+    matrix = Matrix(2, 2)
+    matrix.column_names = ["COI", "COI"]
+    for col, sequence in enumerate(("ACGT", "GGCC")):
+        label = f"s{col}"
+        matrix.sequences[label] = sequence
+        matrix.set_cell(0, col, label)
+    paths = matrix.export_partitions(str(tmp_path))
+    assert sorted(paths) == sorted([str(tmp_path / "COI.fas"), str(tmp_path / "COI_2.fas")])
+    assert (tmp_path / "COI.fas").read_text() == ">Sequence_1\nACGT\n"
+    assert (tmp_path / "COI_2.fas").read_text() == ">Sequence_1\nGGCC\n"
+    lengths, _ = supermatrix_layout(matrix)
+    assert [name for name, _, _ in charsets(matrix, lengths)] == ["COI", "COI_2"]
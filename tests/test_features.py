@@ -0,0 +1,22 @@
+"""Choosing the records to read gene features from, and cutting genes out of them."""
+from seqmatrix.features import cell_accessions, extract
+from seqmatrix.matrix import Matrix
+
+
+def test_only_multigene_records_are_candidates():
+    matrix = Matrix(1, 4)
+    labels = ["MN100001.1 Carabus voucher X cytochrome oxidase subunit I (COI) gene, partial cds; mitochondrial",
+              "NC_012920.1 Homo sapiens mitochondrion, complete genome",
+              "MN100002.1 Carabus NADH dehydrogenase subunit 1 (ND1) gene, partial cds; tRNA-Leu (trnL) gene",
+              "local_7 Carabus mitochondrion, complete genome"]
+    for col, label in enumerate(labels):
+        matrix.set_cell(0, col, label)
+        matrix.sequences[label] = "ACGT"
+    assert cell_accessions(matrix) == ["NC_012920.1", "MN100002.1"]
+
+
+def test_extract_joins_parts_and_reverse_complements_the_minus_strand():
+    sequence = "AAAACCCCGGGGTTTT"
+    assert extract(sequence, ((0, 4, 1), (8, 12, 1))) == "AAAAGGGG"
+    assert extract(sequence, ((4, 8, -1),)) == "GGGG"
+    assert extract(sequence, ((12, 16, -1), (0, 2, -1))) == "AAAATT"
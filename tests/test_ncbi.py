@@ -0,0 +1,226 @@
+"""NCBIFetcher against the local E-utilities stand-in."""
+import time
+
+import pytest
+from Bio.Seq import Seq
+from Bio.SeqFeature import FeatureLocation, SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+from seqmatrix.autoassign import with_qualifiers
+from seqmatrix import cli
+from seqmatrix.cache import AccessionCache
+from seqmatrix.matrix import Matrix
+from seqmatrix.ncbi import NCBIFetcher, RateLimiter
+from seqmatrix.stubserver import StubEutilsServer
+
+
+def record(accession, length=60):
+    bases = "ACGT" * (length // 4)
+    return SeqRecord(Seq(bases), id=f"{accession}.1", name=accession, description=f"Carabus sp. {accession} COI")
+
+
+@pytest.fixture
+def server():
+    with StubEutilsServer(record(f"MN{100000 + i}") for i in range(10)) as server:
+        yield server
+
+
+def fetcher_for(server, **kwargs):
+    kwargs.setdefault("requests_per_second", 1000)
+    kwargs.setdefault("backoff", 0.01)
+    return NCBIFetcher(base_url=server.url, **kwargs)
+
+
+def efetches(server):
+    return [params for endpoint, params in server.requests if endpoint == "efetch.fcgi"]
+
+
+def test_duplicates_are_requested_once(server):
+    records, failures = fetcher_for(server).fetch(["MN100000", "MN100001", "MN100000", " MN100001 "])
+    assert sorted(records) == ["MN100000", "MN100001"]
+    assert not failures
+    assert efetches(server)[0]["id"] == "MN100000,MN100001"
+
+
+def test_batches(server):
+    accessions = [f"MN{100000 + i}" for i in range(10)]
+    records, failures = fetcher_for(server, batch_size=4).fetch(accessions)
+    assert len(records) == 10 and not failures
+    assert sorted(len(params["id"].split(",")) for params in efetches(server)) == [2, 4, 4]
+
+
+def test_versioned_and_missing_accessions(server):
+    records, failures = fetcher_for(server).fetch(["MN100003.1", "MN999999"])
+    assert records["MN100003.1"].id == "MN100003.1"
+    assert failures == {"MN999999": "not found"}
+
+
+def test_transient_errors_are_retried(server):
+    server.fail_next(503, 429)
+    records, failures = fetcher_for(server).fetch(["MN100002"])
+    assert "MN100002" in records and not failures
+    assert len(efetches(server)) == 3
+
+
+def test_retries_give_up(server):
+    server.fail_next(503, 503, 503)
+    records, failures = fetcher_for(server, max_retries=2).fetch(["MN100002"])
+    assert not records
+    assert "503" in failures["MN100002"]
+
+
+def test_rejected_id_fails_alone(server):
+    server.reject("MN100005")
+    accessions = [f"MN{100000 + i}" for i in range(10)]
+    records, failures = fetcher_for(server).fetch(accessions)
+    assert list(failures) == ["MN100005"]
+    assert len(records) == 9
+
+
+def test_malformed_text_is_not_sent(server):
+    records, failures = fetcher_for(server).fetch(["MN100001", "not an accession"])
+    assert failures == {"not an accession": "not an accession number"}
+    assert efetches(server)[0]["id"] == "MN100001"
+
+
+def test_numeric_uids(server):
+    server.add(record("MN200000"), uid=123456)
+    server.add(record("MN200001"), uid=123457)
+    records, failures = fetcher_for(server).fetch(["MN100001", "123456", "99", "123457"])
+    assert records["123456"].id == "MN200000.1"
+    assert records["123457"].id == "MN200001.1"
+    assert records["MN100001"].id == "MN100001.1"
+    assert failures == {"99": "not found"}
+
+
+def test_cache_hits_are_not_requested(server):
+    cache = AccessionCache(":memory:")
+    try:
+        fetcher_for(server, cache=cache).fetch(["MN100001", "MN100002"])
+        requests = len(server.requests)
+        records, failures = fetcher_for(server, cache=cache).fetch(["MN100001", "MN100002"])
+        assert sorted(records) == ["MN100001", "MN100002"] and not failures
+        assert len(server.requests) == requests
+        assert cache.hits == 2
+    finally:
+        cache.close()
+
+
+def test_cancelled_fetch_reports_every_accession(server):
+    fetcher = fetcher_for(server)
+    fetcher.cancel()
+    records, failures = fetcher.fetch(["MN100001", "MN100002"])
+    assert not records
+    assert set(failures) == {"MN100001", "MN100002"}
+    assert not server.requests
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
+
+
+def test_search_pages(server):
+    records, failures = fetcher_for(server, page_size=3).search("Carabus[ORGN] AND COI")
+    assert [r.id for r in records] == [f"MN{100000 + i}.1" for i in range(10)]
+    assert not failures
+    assert len(efetches(server)) == 4
+
+
+def test_genbank_source_qualifiers_are_cached(server):
+    genome = record("MN300000", 400)
+    genome.features.append(SeqFeature(FeatureLocation(0, 400), type="source",
+                                      qualifiers={"specimen_voucher": ["MNHN 12-345"], "organism": ["Carabus"]}))
+    server.add(genome)
+    cache = AccessionCache(":memory:")
+    try:
+        fetcher_for(server, cache=cache).fetch_features(["MN300000"])
+        pairs = with_qualifiers(["MN300000.1 Carabus sp. COI", "local_1 COI"], cache)
+    finally:
+        cache.close()
+    assert pairs == [("MN300000.1 Carabus sp. COI", {"specimen_voucher": "MNHN 12-345"}), ("local_1 COI", None)]
+
+
+def range_matrix(text="MN100000-MN100009"):
+    matrix = Matrix(1, 1)
+    matrix.column_names[0] = "COI"
+    matrix.set_cell(0, 0, text)
+    return matrix
+
+
+def test_range_is_expanded(server):
+    matrix = range_matrix()
+    assert not matrix.resolve(fetcher_for(server))
+    assert matrix.row_count == 10
+    assert not matrix.unresolved()
+    assert matrix.cell(9, 0).startswith("MN100009.1 ")
+
+
+def test_range_is_kept_after_a_failed_batch(server):
+    matrix = range_matrix()
+    server.fail_next(503)
+    failures = matrix.resolve(fetcher_for(server, batch_size=5, max_workers=1, max_retries=0))
+    assert len(failures) == 5
+    assert matrix.unresolved() == ["MN100000-MN100009"] and matrix.row_count == 1
+    # The next run resumes it
+    assert not matrix.resolve(fetcher_for(server))
+    assert matrix.row_count == 10
+
+
+def test_range_is_kept_after_a_cancel(server):
+    matrix = range_matrix()
+    fetcher = fetcher_for(server, batch_size=2, max_workers=1)
+    failures = matrix.resolve(fetcher, callback=lambda accession, record: fetcher.cancel())
+    assert set(failures.values()) == {"cancelled"}
+    assert matrix.unresolved() == ["MN100000-MN100009"] and matrix.row_count == 1
+
+
+def test_range_with_missing_members(server):
+    matrix = range_matrix("MN100005-MN100011")
+    failures = matrix.resolve(fetcher_for(server))
+    assert failures == {"MN100010": "not found", "MN100011": "not found"}
+    assert matrix.row_count == 5 and not matrix.unresolved()
+
+
+def test_query_is_expanded(server):
+    matrix = range_matrix("COI AND Carabus[ORGN]")
+    assert not matrix.resolve(fetcher_for(server, page_size=4))
+    assert matrix.row_count == 10
+
+
+def test_malformed_cells_are_not_sent(server):
+    matrix = range_matrix("MN1000 01")
+    matrix.resolve(fetcher_for(server))
+    assert not server.requests
+
+
+def test_cli_reports_failed_range_members(server, tmp_path, capsys):
+    table = tmp_path / "table.tsv"
+    table.write_text("taxon\tCOI\nCarabus\tMN100005-MN100010\n")
+    status = cli.main([str(table), "-o", str(tmp_path / "out"), "--no-cache", "--eutils-url", server.url])
+    assert status == 1
+    assert "[ERROR] Failed to download MN100010: not found" in capsys.readouterr().err
+    assert (tmp_path / "out" / "COI.fas").read_text().count(">") == 5
+
+
+def test_overlapping_ranges_share_rows(server):
+    matrix = Matrix(2, 2)
+    matrix.column_names = ["COI", "16S"]
+    matrix.set_cell(0, 0, "MN100000-MN100004")
+    matrix.set_cell(1, 0, "MN100003-MN100006")
+    matrix.set_cell(0, 1, "MN100000-MN100002")
+    assert not matrix.resolve(fetcher_for(server))
+    assert len(set(matrix.row_names)) == matrix.row_count == 8
+    assert [matrix.cell(row, 1).split(" ", 1)[0] for row in range(matrix.row_count)] == \
+        ["MN100000.1", "", "MN100001.1", "MN100002.1", "", "", "", ""]
+
+
+def test_expanded_rows_get_names_of_their_own():
+    matrix = range_matrix("COI AND Carabus[ORGN]")
+    matrix.add_row("MN100001.1")
+    matrix.set_cell(1, 0, "MN100001.1 an older record")
+    assert matrix.expand("COI AND Carabus[ORGN]", ["MN100000.1 a", "MN100001.1 b", "MN100002.1 c"]) == 2
+    assert matrix.row_names == ["Sequence_1", "MN100001.1", "MN100001.1_2", "MN100002.1"]
@@ -0,0 +1,34 @@
+"""Orienting and trimming partitions to a reference."""
+import numpy as np
+
+from seqmatrix.nucleotides import reverse_complement
+from seqmatrix.prepare import orient_and_trim
+
+LOCUS = (b"ATGGCTTCAGGACTTCTAGCCCGAATTGGCAGTTAACGGTCAATGCCTAGGATTCGACCGTAACGAT"
+         b"CGGTACCTTAGCAATGCGTTACGGACTATCGGACTTAGCCATGGCAATCGGATCGTAGCTAGCTTA")
+FLANK = b"GATTACAGATTACAGGCCTTAACCGGTTAAGGCTTGACTGACTGGACCAATTGGCCAAGGTT"
+
+
+def test_minority_strand_is_reversed_even_when_the_median_is_on_it():
+    # Sorted by length the reversed ones are in the middle
+    sequences = [LOCUS[5:], reverse_complement(LOCUS), FLANK + LOCUS + FLANK] * 2
+    results = orient_and_trim(None, sequences)
+    assert [reversed_ for _, reversed_, _, _ in results] == [False, True, False] * 2
+    for original, (data, _, _, matched) in zip(sequences, results):
+        assert matched
+        assert (original if data is None else data) in LOCUS
+
+
+def test_orientation_follows_a_given_reference():
+    results = orient_and_trim(reverse_complement(LOCUS), [LOCUS, LOCUS])
+    assert all(reversed_ for _, reversed_, _, _ in results)
+
+
+def test_unrelated_sequences_are_not_matched():
+    random = np.random.default_rng(1)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    sequences = [random.choice(bases, 16500).tobytes() for _ in range(5)]
+    results = orient_and_trim(None, sequences)
+    # The median one is its own reference
+    assert [matched for _, _, _, matched in results].count(True) == 1
+    assert all(data is None for data, _, _, _ in results)
@@ -0,0 +1,41 @@
+"""Saving a project, saving it again after edits, and opening it."""
+from seqmatrix.matrix import Matrix
+from seqmatrix.project import ProjectFile
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "beetles.smproj")
+    matrix = Matrix(2, 2)
+    matrix.column_names = ["COI", "16S"]
+    for row, col, label, sequence in ((0, 0, "MN1.1 COI", "ACGT"), (0, 1, "MN2.1 16S", "GGCC"),
+                                      (1, 0, "MN3.1 COI", "ACGT")):
+        matrix.set_cell(row, col, label)
+        matrix.sequences[label] = sequence
+    project = ProjectFile(path)
+    assert project.save(matrix) == 3
+
+    # Saved sequences are now read back from the project
+    assert matrix.sequences.source("MN1.1 COI") is project
+    matrix.sequences["MN1.1 COI"] = "ACGTT"
+    matrix.sequences["MN4.1 16S"] = matrix.sequences["MN2.1 16S"]
+    del matrix.sequences["MN2.1 16S"]
+    matrix.relabel("MN2.1 16S", "MN4.1 16S")
+    matrix.row_names[1] = "Carabus"
+    assert project.save(matrix) == 2
+    project.close()
+
+    project = ProjectFile(path)
+    try:
+        reopened = project.load()
+        assert reopened.row_names == ["Sequence_1", "Carabus"]
+        assert reopened.column_names == ["COI", "16S"]
+        assert [reopened.cell(row, col) for row in range(2) for col in range(2)] == \
+            ["MN1.1 COI", "MN4.1 16S", "MN3.1 COI", ""]
+        assert reopened.sequences["MN1.1 COI"] == "ACGTT"
+        assert reopened.sequences["MN4.1 16S"] == "GGCC"
+        assert reopened.sequences["MN3.1 COI"] == "ACGT"
+        # Neither the old label nor the old content of the changed one is kept
+        assert sorted(reopened.sequences) == ["MN1.1 COI", "MN3.1 COI", "MN4.1 16S"]
+        assert len(set(project.records.values())) == 3
+    finally:
+        project.close()
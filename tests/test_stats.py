@@ -0,0 +1,27 @@
+"""Counting the sequences of the matrix."""
+import os
+
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.matrix import Matrix
+from seqmatrix.stats import MatrixStats
+
+
+def test_unreadable_sequences_count_as_absent(tmp_path):
+    path = tmp_path / "a.fas"
+    path.write_text(">s1\nACGG\n>s2\nAC\n")
+    matrix = Matrix(1, 2)
+    matrix.sequences.add_index(FastaIndex.build(str(path)))
+    matrix.set_cell(0, 0, "s1")
+    matrix.set_cell(0, 1, "s3")
+    matrix.sequences["s3"] = "ACGT"
+    os.remove(path)
+
+    stats = MatrixStats(matrix)
+    todo = stats.changed()
+    failures = {}
+    stats.apply(todo, stats.count(todo, failures), failures)
+    assert list(failures) == [1]
+    assert stats.cell(0, 0) is None
+    assert stats.cell(0, 1).gc == 0.5
+    # Not tried again until the label gets another sequence
+    assert not stats.changed()
@@ -0,0 +1,31 @@
+"""Overlapping imports and downloads in the sequence pool."""
+from seqmatrix.fastaindex import FastaIndex
+from seqmatrix.store import SequenceStore
+
+
+def index_of(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return FastaIndex.build(str(path))
+
+
+def test_overlapping_records_are_compared_by_digest(tmp_path):
+    first = index_of(tmp_path, "a.fas", ">s1 COI\nACGT\nACGT\n>s2 COI\nGGGG\n")
+    second = index_of(tmp_path, "b.fas", ">s1 COI\nACGTACGT\n>s2 COI\nGGGGCC\n>s3 COI\nTT\n")
+    store = SequenceStore()
+    store["s3 COI"] = "TTA"
+    store.add_index(first)
+    store.add_index(second)
+    assert [(c.label, c.old_length, c.new_length) for c in store.take_collisions()] == \
+        [("s3 COI", 3, 2), ("s2 COI", 4, 6)]
+    assert store.source("s1 COI") is second and store["s2 COI"] == "GGGGCC"
+    store["s1 COI"] = "ACGTACGT"
+    store["s2 COI"] = "GG"
+    assert [c.label for c in store.take_collisions()] == ["s2 COI"]
+
+
+def test_index_digest_matches_the_store(tmp_path):
+    index = index_of(tmp_path, "a.fas", ">s1\r\nAC GT\r\nAC\r\n")
+    store = SequenceStore()
+    store["s1"] = "ACGTAC"
+    assert index.digest("s1") == store.content_key("s1")